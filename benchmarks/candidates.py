@@ -0,0 +1,81 @@
+"""Measure time and memory needed to turn an index page into candidates.
+
+Usage: python -m benchmarks.candidates [INDEX_PAGE.json.gz] [--repeat N]
+"""
+
+import argparse
+import logging
+import gc
+import gzip
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+from untangled_snakes import AppContext, Identifier, SimpleIndexFinder
+
+DEFAULT_PAGE = (
+    Path(__file__).parent.parent
+    / "tests/cases/requests-socks/index/charset-normalizer.json.gz"
+)
+
+arg_parser = argparse.ArgumentParser()
+arg_parser.add_argument("page", nargs="?", type=Path, default=DEFAULT_PAGE)
+arg_parser.add_argument(
+    "--repeat",
+    type=int,
+    default=10,
+    help="Concatenate the pages files this many times, to simulate large projects.",
+)
+
+
+class RecordedIndexFinder(SimpleIndexFinder):
+    def __init__(self, app_context, data):
+        super().__init__(app_context)
+        self.data = data
+
+    def _fetch_project(self, name):
+        return self.data
+
+
+def main():
+    args = arg_parser.parse_args()
+    logging.disable(logging.INFO)
+    with gzip.open(args.page, "rt") as f:
+        data = json.load(f)
+    data["files"] = data["files"] * args.repeat
+    identifier = Identifier(data["name"])
+    app_context = AppContext(prefetch_workers=0)
+
+    def find_candidates():
+        finder = RecordedIndexFinder(app_context, data)
+        return list(finder.find_candidates(identifier))
+
+    gc.collect()
+    start = time.perf_counter()
+    candidates = find_candidates()
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for candidate in candidates:
+        candidate.version
+    versions_elapsed = time.perf_counter() - start
+    del candidates
+
+    # measure memory separately, as tracing slows everything down
+    gc.collect()
+    tracemalloc.start()
+    candidates = find_candidates()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"files:       {len(data['files'])}")
+    print(f"candidates:  {len(candidates)}")
+    print(f"time:        {elapsed * 1000:.1f} ms")
+    print(f"versions:    {versions_elapsed * 1000:.1f} ms")
+    print(f"retained:    {current / 1024:.0f} KiB")
+    print(f"peak:        {peak / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Resolve recorded test cases end to end against a local index stand-in.
+
+Index pages, metadata and minimal distribution files of each case are served
+from a local HTTP server with configurable per-request latency. For each case,
+wall time, requests by kind, resolver rounds and peak memory are reported.
+
+Usage: python -m benchmarks.replay [CASE ...] [--latency MS] [--repeat N]
+"""
+
+import argparse
+import json
+import logging
+import re
+import statistics
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from packaging.requirements import Requirement
+
+from untangled_snakes import AppContext, SimpleIndexFinder, generate_lock, resolve
+from untangled_snakes.reporters import SilentReporter
+from tests.conftest import build_distribution, read_case, served_files
+
+CASES_PATH = Path(__file__).parent.parent / "tests" / "cases"
+RANGE_RE = re.compile(r"bytes=(?P<start>\d*)-(?P<end>\d*)")
+
+arg_parser = argparse.ArgumentParser()
+arg_parser.add_argument("cases", nargs="*")
+arg_parser.add_argument(
+    "--latency", type=float, default=20, help="Milliseconds to delay each request."
+)
+arg_parser.add_argument("--repeat", type=int, default=3)
+arg_parser.add_argument("--prefetch-workers", type=int, default=8)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """Serve a recorded test case like a PEP 691 index and its file host."""
+
+    daemon_threads = True
+
+    def __init__(self, case_path, latency=0.0):
+        super().__init__(("127.0.0.1", 0), ReplayHandler)
+        self.latency = latency
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self.inputs, self.lock_file, pages, metadata = read_case(case_path)
+
+        self.pages = dict()
+        self.files = dict()
+        self.metadata = dict()
+        for item, data in served_files(pages, metadata):
+            filename = item["filename"]
+            if item.get("core-metadata"):
+                self.metadata[filename] = data
+            else:
+                self.files[filename] = build_distribution(filename, data)
+        for name, data in pages.items():
+            for item in data["files"]:
+                item["url"] = f"{self.url}/files/{item['filename']}"
+            self.pages[name] = json.dumps(data).encode()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def index_url(self):
+        return f"{self.url}/simple"
+
+    def count(self, kind):
+        with self.lock:
+            self.requests[kind] += 1
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        path = unquote(urlsplit(self.path).path)
+        if path.startswith("/simple/"):
+            name = path.removeprefix("/simple/").strip("/")
+            self._send("index", self.server.pages.get(name), "application/json")
+        elif path.startswith("/files/"):
+            filename = path.removeprefix("/files/")
+            if filename.endswith(".metadata"):
+                content = self.server.metadata.get(filename.removesuffix(".metadata"))
+                self._send("metadata", content, "text/plain")
+            else:
+                self._send_file(self.server.files.get(filename))
+        else:
+            self._send("unknown", None)
+
+    def _send(self, kind, content, content_type=None, status=200, headers={}):
+        self.server.count(kind if content is not None else "not found")
+        if content is None:
+            status, content = 404, b"not found"
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _send_file(self, content):
+        match = RANGE_RE.match(self.headers.get("Range", ""))
+        if content is None or not match:
+            return self._send("file", content, "application/octet-stream")
+        length = len(content)
+        start, end = match.group("start"), match.group("end")
+        if not start:
+            start, end = max(0, length - int(end)), length - 1
+        else:
+            start, end = int(start), min(int(end or length - 1), length - 1)
+        self._send(
+            "range",
+            content[start : end + 1],
+            "application/octet-stream",
+            status=206,
+            headers={"Content-Range": f"bytes {start}-{end}/{length}"},
+        )
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_case(case_path, latency, prefetch_workers, trace_memory=False):
+    with ReplayServer(case_path, latency) as server:
+        requirements = [Requirement(r) for r in server.inputs["requirements"]]
+        app_context = AppContext(prefetch_workers=prefetch_workers)
+        finder = SimpleIndexFinder(app_context, index_url=server.index_url)
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = resolve(app_context, requirements, SilentReporter(), finder)
+        elapsed = time.perf_counter() - start
+        peak = None
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        finder.close()
+        app_context.close()
+        lock = generate_lock(result)
+        # URLs point to the local server, so only compare versions and hashes
+        correct = {
+            name: (source["version"], source["sha256"])
+            for name, source in lock["sources"].items()
+        } == {
+            name: (source["version"], source["sha256"])
+            for name, source in server.lock_file["sources"].items()
+        }
+        return {
+            "time": elapsed,
+            "peak": peak,
+            "requests": dict(server.requests),
+            "rounds": app_context.profile.counters["resolver.rounds"],
+            "correct": correct,
+        }
+
+
+def main():
+    args = arg_parser.parse_args()
+    logging.disable(logging.INFO)
+    names = args.cases or sorted(p.name for p in CASES_PATH.iterdir() if p.is_dir())
+    latency = args.latency / 1000
+
+    for name in names:
+        case_path = CASES_PATH / name
+        runs = [
+            run_case(case_path, latency, args.prefetch_workers)
+            for _ in range(args.repeat)
+        ]
+        memory = run_case(case_path, latency, args.prefetch_workers, True)
+        times = [run["time"] for run in runs]
+        requests = runs[0]["requests"]
+        print(f"{name}:")
+        print(f"  wall time:  {statistics.median(times) * 1000:.1f} ms (median)")
+        print(
+            f"  requests:   {sum(requests.values())} {dict(sorted(requests.items()))}"
+        )
+        print(f"  rounds:     {runs[0]['rounds']}")
+        print(f"  peak mem:   {memory['peak'] / 1024:.0f} KiB")
+        print(f"  lock:       {'ok' if runs[0]['correct'] else 'MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
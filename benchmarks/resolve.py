@@ -0,0 +1,84 @@
+"""Measure resolver rounds and wall time on the recorded test cases.
+
+Usage: python -m benchmarks.resolve [CASE ...] [--repeat N] [--preference NAME]
+"""
+
+import argparse
+import logging
+import statistics
+import time
+from pathlib import Path
+
+import requests_mock
+from packaging.requirements import Requirement
+from resolvelib import BaseReporter, Resolver
+
+from untangled_snakes import AppContext, PyPiProvider, SimpleIndexFinder
+from tests.conftest import mock_case
+
+CASES_PATH = Path(__file__).parent.parent / "tests" / "cases"
+
+arg_parser = argparse.ArgumentParser()
+arg_parser.add_argument("cases", nargs="*")
+arg_parser.add_argument("--repeat", type=int, default=5)
+arg_parser.add_argument(
+    "--preference",
+    choices=["default", "count"],
+    default="default",
+    help="count: prefer identifiers with fewer candidates only, by walking them.",
+)
+
+
+class RoundCounter(BaseReporter):
+    def __init__(self):
+        self.rounds = 0
+
+    def starting_round(self, index):
+        self.rounds += 1
+
+
+class CountingProvider(PyPiProvider):
+    def get_preference(
+        self, identifier, resolutions, candidates, information, backtrack_causes
+    ):
+        return sum(1 for _ in candidates[identifier])
+
+
+PROVIDERS = {"default": PyPiProvider, "count": CountingProvider}
+
+
+def run_case(case_path, provider_cls):
+    with requests_mock.Mocker() as mocker:
+        inputs, _ = mock_case(mocker, case_path)
+        requirements = [Requirement(r) for r in inputs["requirements"]]
+        finder = SimpleIndexFinder(AppContext(prefetch_workers=0))
+        reporter = RoundCounter()
+        resolver = Resolver(provider_cls(finder), reporter)
+        start = time.perf_counter()
+        resolver.resolve(requirements, max_rounds=500)
+        elapsed = time.perf_counter() - start
+        finder.close()
+    return reporter.rounds, elapsed
+
+
+def main():
+    args = arg_parser.parse_args()
+    logging.disable(logging.INFO)
+    names = args.cases or sorted(p.name for p in CASES_PATH.iterdir() if p.is_dir())
+    provider_cls = PROVIDERS[args.preference]
+
+    print(f"{'case':<30} {'rounds':>8} {'median':>10} {'min':>10}")
+    for name in names:
+        results = [
+            run_case(CASES_PATH / name, provider_cls) for _ in range(args.repeat)
+        ]
+        rounds = results[0][0]
+        times = [elapsed for _, elapsed in results]
+        print(
+            f"{name:<30} {rounds:>8} "
+            f"{statistics.median(times) * 1000:>8.1f}ms {min(times) * 1000:>8.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
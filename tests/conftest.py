@@ -1,6 +1,10 @@
 import json
 import gzip
+from hashlib import sha256
+import tarfile
+from io import BytesIO
 from pathlib import Path
+from zipfile import ZipFile
 
 import pytest
 from resolvelib import Resolver, BaseReporter
@@ -9,6 +13,7 @@ from untangled_snakes import (
     PyPiProvider,
     SimpleIndexFinder,
     AppContext,
+    Distribution,
 )
 
 
@@ -44,35 +49,107 @@ def resolver(reporter):
     return resolver
 
 
+def build_distribution(filename, metadata):
+    """Build a minimal distribution file, which only contains metadata."""
+    distribution = Distribution(filename)
+    buffer = BytesIO()
+    if distribution.is_wheel:
+        with ZipFile(buffer, "w") as zip:
+            zip.writestr(distribution.metadata_path, metadata)
+    else:
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+            info = tarfile.TarInfo(distribution.metadata_path)
+            info.size = len(metadata)
+            tar.addfile(info, BytesIO(metadata))
+    return buffer.getvalue()
+
+
+def read_case(case_path):
+    """Read inputs, expected lock, index pages and metadata of a test case."""
+    with open(case_path / "inputs.json", "r") as f:
+        inputs = json.load(f)
+
+    with open(case_path / "lock.json", "r") as f:
+        lock = json.load(f)
+
+    metadata_by_filename = dict()
+    for path in case_path.glob("metadata/*.metadata.gz"):
+        filename = path.name.removesuffix(".metadata.gz")
+        with gzip.open(path, "rb") as f:
+            metadata_by_filename[filename] = f.read()
+
+    pages = dict()
+    for path in case_path.glob("index/*.json.gz"):
+        name = path.name.removesuffix("".join(path.suffixes))
+        with gzip.open(path, "rt") as f:
+            data = json.load(f)
+        for item in data["files"]:
+            metadata = metadata_by_filename.get(item["filename"])
+            hashes = item.get("core-metadata")
+            if metadata and isinstance(hashes, dict):
+                # recorded metadata only contains the headers, so it
+                # might not match the hash of the original file.
+                if sha256(metadata).hexdigest() != hashes.get("sha256"):
+                    item["core-metadata"] = True
+        pages[name] = data
+
+    return inputs, lock, pages, metadata_by_filename
+
+
+def served_files(pages, metadata_by_filename):
+    """Yield (item, metadata) for each file of the index pages to serve.
+
+    Metadata is only recorded for the file of a release it was read from,
+    which depends on the files available, it's served for all of them.
+    """
+    files_by_release = dict()
+    for data in pages.values():
+        for item in data["files"]:
+            try:
+                distribution = Distribution(item["filename"])
+            except Exception:
+                continue
+            release = (distribution.name, distribution.version)
+            files_by_release.setdefault(release, []).append(item)
+
+    for filename, data in metadata_by_filename.items():
+        distribution = Distribution(filename)
+        for item in files_by_release[(distribution.name, distribution.version)]:
+            if (
+                item["filename"] in metadata_by_filename
+                and item["filename"] != filename
+            ):
+                continue
+            hashes = item.get("core-metadata")
+            if isinstance(hashes, dict) and sha256(data).hexdigest() != hashes.get(
+                "sha256"
+            ):
+                item["core-metadata"] = True
+            yield item, data
+
+
+def mock_case(requests_mock, case_path, index_url="https://pypi.org/simple"):
+    """Serve the recorded index pages and metadata of a test case."""
+    inputs, lock, pages, metadata_by_filename = read_case(case_path)
+
+    for item, data in served_files(pages, metadata_by_filename):
+        if item.get("core-metadata"):
+            requests_mock.get(f"{item['url']}.metadata", content=data)
+        else:
+            content = build_distribution(item["filename"], data)
+            requests_mock.get(item["url"], content=content)
+
+    for name, data in pages.items():
+        requests_mock.get(f"{index_url}/{name}", json=data)
+
+    return (inputs, lock)
+
+
 @pytest.fixture
 def load_case(requests_mock):
     cases_path = Path("tests/cases")
 
     def _load_case(name, index_url="https://pypi.org/simple"):
-        case_path = cases_path / name
-
-        with open(case_path / "inputs.json", "r") as f:
-            inputs = json.load(f)
-
-        with open(case_path / "lock.json", "r") as f:
-            lock = json.load(f)
-
-        urls_by_filename = dict()
-        for path in case_path.glob("index/*.json.gz"):
-            name = path.name.removesuffix("".join(path.suffixes))
-            with gzip.open(path, "rt") as f:
-                data = json.load(f)
-            requests_mock.get(f"{index_url}/{name}", json=data)
-            for item in data["files"]:
-                urls_by_filename[item["filename"]] = item["url"]
-
-        for path in case_path.glob("metadata/*.metadata.gz"):
-            filename = path.name.removesuffix(".metadata.gz")
-            with gzip.open(path, "rt") as f:
-                data = f.read()
-            url = urls_by_filename[filename]
-            requests_mock.get(f"{url}.metadata", text=data)
-
-        return (inputs, lock)
+        return mock_case(requests_mock, cases_path / name, index_url)
 
     return _load_case
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from untangled_snakes import AppContext, resolve_batch
+from untangled_snakes.batch import read_manifest, read_requirements_file
+
+
+def test_read_manifest_directory(tmp_path):
+    manifest = tmp_path / "projects"
+    manifest.mkdir()
+    (manifest / "web.txt").write_text("# the web app\nrequests[socks]\n\nrich  # ui\n")
+    (manifest / "cli.txt").write_text("requests\n")
+    (manifest / "README").write_text("not a requirements file")
+
+    jobs = read_manifest(manifest, tmp_path / "locks")
+    assert [job.name for job in jobs] == ["cli", "web"]
+    assert [str(r) for r in jobs[1].requirements] == ["requests[socks]", "rich"]
+    assert jobs[1].output == tmp_path / "locks" / "web.json"
+
+
+def test_read_requirements_file(tmp_path):
+    path = tmp_path / "requirements.txt"
+    path.write_text(
+        "--index-url https://pypi.org/simple\n"
+        "foo @ https://example.com/foo-1.0.tar.gz#sha256=abc  # pinned\n"
+        "bar==1.0 --hash=sha256:abc\n"
+        "#egg=baz\n"
+    )
+    requirements = read_requirements_file(path)
+    assert [r.name for r in requirements] == ["foo", "bar"]
+    assert requirements[0].url == "https://example.com/foo-1.0.tar.gz#sha256=abc"
+    assert str(requirements[1].specifier) == "==1.0"
+
+    for line in ["-r other.txt", "--constraint=constraints.txt", "-e ."]:
+        path.write_text(f"foo\n{line}\n")
+        with pytest.raises(ValueError, match="requirements.txt:2"):
+            read_requirements_file(path)
+
+
+def test_read_manifest_json_lines(tmp_path):
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text(
+        '{"name": "web", "requirements": ["requests[socks]"]}\n'
+        "\n"
+        '{"requirements": ["requests"], "output": "cli/lock.json"}\n'
+    )
+    jobs = read_manifest(manifest, tmp_path)
+    assert [job.name for job in jobs] == ["web", "3"]
+    assert jobs[0].output == tmp_path / "web.json"
+    assert jobs[1].output == tmp_path / "cli" / "lock.json"
+
+    manifest.write_text(
+        '{"name": "a", "requirements": [], "output": "lock.json"}\n'
+        '{"name": "b", "requirements": [], "output": "lock.json"}\n'
+    )
+    with pytest.raises(ValueError):
+        read_manifest(manifest, tmp_path)
+
+
+def test_resolve_batch(load_case, requests_mock, tmp_path):
+    inputs, expected_lock = load_case("requests-socks")
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text(
+        json.dumps({"name": "socks", "requirements": inputs["requirements"]})
+        + "\n"
+        + json.dumps({"name": "plain", "requirements": ["requests"]})
+        + "\n"
+        + json.dumps({"name": "broken", "requirements": ["requests<0"]})
+        + "\n"
+    )
+    jobs = read_manifest(manifest, tmp_path / "locks")
+
+    failed = resolve_batch(AppContext(), jobs, workers=2)
+    assert [job.name for job in failed] == ["broken"]
+    assert json.loads((tmp_path / "locks" / "socks.json").read_text()) == expected_lock
+    plain = json.loads((tmp_path / "locks" / "plain.json").read_text())
+    assert "pysocks" not in plain["sources"]
+    assert not (tmp_path / "locks" / "broken.json").exists()
+
+    # index pages are shared between all resolutions
+    requested = [r.url for r in requests_mock.request_history]
+    assert len([url for url in requested if url.endswith("/simple/requests")]) == 1
@@ -0,0 +1,141 @@
+import pytest
+from packaging.requirements import Requirement
+from requests import HTTPError
+from resolvelib import Resolver, BaseReporter
+
+from untangled_snakes import (
+    AppContext,
+    Identifier,
+    PyPiProvider,
+    SimpleIndexFinder,
+    generate_lock,
+)
+from untangled_snakes.cache import metadata_key
+from untangled_snakes.instrumentation import Profile
+from untangled_snakes.lru import LRUCache
+
+INDEX_URL = "https://pypi.org/simple"
+PAGE = {"files": [], "meta": {"api-version": "1.1"}, "name": "foo"}
+
+
+def find(app_context):
+    finder = SimpleIndexFinder(app_context, index_url=INDEX_URL)
+    candidates = list(finder.find_candidates(Identifier("foo")))
+    finder.close()
+    return candidates
+
+
+def test_index_cache_revalidates(requests_mock, tmp_path):
+    requests_mock.get(f"{INDEX_URL}/foo", json=PAGE, headers={"ETag": '"v1"'})
+    find(AppContext(cache_dir=tmp_path))
+    assert "If-None-Match" not in requests_mock.last_request.headers
+
+    requests_mock.get(f"{INDEX_URL}/foo", status_code=304)
+    find(AppContext(cache_dir=tmp_path))
+    assert requests_mock.call_count == 2
+    assert requests_mock.last_request.headers["If-None-Match"] == '"v1"'
+
+
+def test_index_cache_max_age(requests_mock, tmp_path):
+    requests_mock.get(f"{INDEX_URL}/foo", json=PAGE, headers={"ETag": '"v1"'})
+    find(AppContext(cache_dir=tmp_path, index_max_age=3600))
+    find(AppContext(cache_dir=tmp_path, index_max_age=3600))
+    assert requests_mock.call_count == 1
+
+
+def test_index_failure_not_kept(requests_mock):
+    requests_mock.get(f"{INDEX_URL}/foo", status_code=503)
+    finder = SimpleIndexFinder(AppContext(retries=0), index_url=INDEX_URL)
+    with pytest.raises(HTTPError):
+        list(finder.find_candidates(Identifier("foo")))
+
+    # the index recovered, the same finder fetches the page again
+    requests_mock.get(f"{INDEX_URL}/foo", json=PAGE)
+    assert list(finder.find_candidates(Identifier("foo"))) == []
+    assert requests_mock.call_count == 2
+    finder.close()
+
+
+def test_metadata_store(load_case, requests_mock, tmp_path):
+    inputs, expected_lock = load_case("requests-socks")
+    requirements = [Requirement(r) for r in inputs["requirements"]]
+
+    def resolve():
+        finder = SimpleIndexFinder(AppContext(cache_dir=tmp_path))
+        resolver = Resolver(PyPiProvider(finder), BaseReporter())
+        result = resolver.resolve(requirements)
+        finder.close()
+        return generate_lock(result)
+
+    assert resolve() == expected_lock
+    requests_mock.reset_mock()
+    assert resolve() == expected_lock
+    assert not [r for r in requests_mock.request_history if "files." in r.url]
+
+
+def test_lru_cache():
+    profile = Profile()
+    cache = LRUCache("test", max_entries=2, max_bytes=10, sizeof=len, profile=profile)
+    assert cache.setdefault("a", "1234") == "1234"
+    assert cache.setdefault("a", "other") == "1234"
+    cache.setdefault("b", "1234")
+    assert cache.get("a") == "1234"
+    # over the byte budget, b is the least recently used
+    cache.setdefault("c", "1234")
+    assert cache.get("b") is None
+    assert cache.stats() == {"entries": 2, "bytes": 8}
+    # over the entry budget
+    cache.setdefault("d", "")
+    assert "a" not in cache
+    assert profile.counters == {"test.hit": 1, "test.miss": 1, "test.evicted": 2}
+
+
+def test_bounded_memory(load_case, requests_mock, tmp_path):
+    inputs, expected_lock = load_case("requests-socks")
+    requirements = [Requirement(r) for r in inputs["requirements"]]
+    app_context = AppContext(cache_dir=tmp_path, max_projects=1, max_metadata_bytes=1)
+    finder = SimpleIndexFinder(app_context)
+    resolver = Resolver(PyPiProvider(finder), BaseReporter())
+    result = resolver.resolve(requirements)
+    finder.close()
+    assert generate_lock(result) == expected_lock
+    assert len(finder.cache) == len(app_context.metadata_cache) == 1
+
+    counters = app_context.profile.counters
+    assert counters["memory.projects.evicted"] == 5
+    assert counters["memory.metadata.evicted"] > 0
+    metadata_requests = [r for r in requests_mock.request_history if "files." in r.url]
+    assert len(metadata_requests) == 6
+
+    # evicted metadata is read from the store again, not fetched
+    requests_mock.reset_mock()
+
+    def metadata_source(candidate):
+        while candidate.base is not None:
+            candidate = candidate.base
+        return candidate
+
+    candidate = next(
+        c
+        for c in result.mapping.values()
+        if metadata_key(metadata_source(c)) not in app_context.metadata_cache
+    )
+    assert candidate.metadata["Name"].lower() == candidate.name
+    assert counters["metadata.store.hit"] == 1
+    assert requests_mock.call_count == 0
+
+
+def test_metadata_cache_shared_by_evicted_projects(load_case):
+    inputs, expected_lock = load_case("requests-socks")
+    requirements = [Requirement(r) for r in inputs["requirements"]]
+    app_context = AppContext(max_projects=1)
+    finder = SimpleIndexFinder(app_context)
+    sizes = []
+    for _ in range(3):
+        resolver = Resolver(PyPiProvider(finder), BaseReporter())
+        assert generate_lock(resolver.resolve(requirements)) == expected_lock
+        sizes.append(len(app_context.metadata_cache))
+    finder.close()
+    # candidates created again for evicted projects reuse their metadata
+    assert sizes == [sizes[0]] * 3
+    assert app_context.profile.counters["memory.projects.evicted"] > 5
@@ -0,0 +1,107 @@
+from hashlib import sha256
+from pathlib import Path
+
+from packaging.requirements import Requirement
+
+from untangled_snakes import AppContext, LocalFinder, generate_lock, resolve
+from untangled_snakes.catalog import CATALOG_NAME, Catalog
+from untangled_snakes.finders import make_finder
+from untangled_snakes.locks import locked_candidates
+from untangled_snakes.reporters import SilentReporter
+
+from .conftest import build_distribution, read_case
+
+CASE_PATH = Path("tests/cases/requests-socks")
+
+
+def wheelhouse(path):
+    """Write the distributions of the requests-socks case to path."""
+    inputs, lock, pages, metadata = read_case(CASE_PATH)
+    path.mkdir()
+    for filename, data in metadata.items():
+        (path / filename).write_bytes(build_distribution(filename, data))
+    return inputs, lock
+
+
+def test_local_finder(tmp_path, requests_mock):
+    inputs, expected_lock = wheelhouse(tmp_path / "wheels")
+    app_context = AppContext(index_url=(tmp_path / "wheels").as_uri())
+    finder = make_finder(app_context)
+    assert isinstance(finder, LocalFinder)
+
+    requirements = [Requirement(r) for r in inputs["requirements"]]
+    result = resolve(app_context, requirements, SilentReporter(), finder)
+    finder.close()
+    lock = generate_lock(result)
+    assert lock["targets"] == expected_lock["targets"]
+    for name, source in lock["sources"].items():
+        assert source["version"] == expected_lock["sources"][name]["version"]
+        path = tmp_path / "wheels" / Path(source["url"]).name
+        assert source["url"] == path.as_uri()
+        assert source["sha256"] == sha256(path.read_bytes()).hexdigest()
+    assert requests_mock.call_count == 0
+
+
+def test_local_finder_from_lock(tmp_path, requests_mock):
+    inputs, _ = wheelhouse(tmp_path / "wheels")
+    requirements = [Requirement(r) for r in inputs["requirements"]]
+
+    def lock(locked=None):
+        app_context = AppContext(
+            index_url=str(tmp_path / "wheels"), cache_dir=tmp_path / "cache"
+        )
+        if locked:
+            locked = locked_candidates(app_context, locked)
+        result = resolve(app_context, requirements, SilentReporter(), locked=locked)
+        app_context.close()
+        return generate_lock(result)
+
+    expected_lock = lock()
+    # locked file:// sources get their metadata from the catalog
+    assert lock(expected_lock) == expected_lock
+    assert requests_mock.call_count == 0
+
+
+def test_catalog_update(tmp_path):
+    wheels = tmp_path / "wheels"
+    wheelhouse(wheels)
+    catalog = Catalog(tmp_path / "catalog.sqlite")
+    assert catalog.update(wheels) == (6, 0)
+    assert catalog.update(wheels) == (0, 0)
+
+    metadata = b"Metadata-Version: 2.1\nName: foo\nVersion: 1.0\n"
+    (wheels / "foo").mkdir()
+    (wheels / "foo" / "foo-1.0.tar.gz").write_bytes(
+        build_distribution("foo-1.0.tar.gz", metadata)
+    )
+    (wheels / "idna-3.4-py3-none-any.whl").unlink()
+    assert catalog.update(wheels) == (1, 1)
+    assert catalog.files("idna") == []
+    [(path, _, _)] = catalog.files("foo")
+    assert path == "foo/foo-1.0.tar.gz"
+    assert catalog.metadata(path)["Name"] == "foo"
+
+    # the catalog is persistent
+    catalog.close()
+    catalog = Catalog(tmp_path / "catalog.sqlite")
+    assert catalog.update(wheels) == (0, 0)
+    [(path, _, requires_python)] = catalog.files("urllib3")
+    assert requires_python == ">=3.7"
+    assert catalog.metadata(path)["Version"] == "2.0.4"
+
+
+def test_read_only_wheelhouse(tmp_path, requests_mock):
+    inputs, expected_lock = wheelhouse(tmp_path / "wheels")
+    # a directory in the catalog's place can't be opened, as the catalog of
+    # a read-only directory
+    (tmp_path / "wheels" / CATALOG_NAME).mkdir()
+    requirements = [Requirement(r) for r in inputs["requirements"]]
+    for cache_dir in [None, tmp_path / "cache"]:
+        app_context = AppContext(
+            index_url=str(tmp_path / "wheels"), cache_dir=cache_dir
+        )
+        finder = make_finder(app_context)
+        result = resolve(app_context, requirements, SilentReporter(), finder)
+        finder.close()
+        assert generate_lock(result)["targets"] == expected_lock["targets"]
+    assert len(list((tmp_path / "cache" / "catalogs").glob("*.sqlite"))) == 1
@@ -1,9 +1,15 @@
 import pytest
 
 from packaging.requirements import Requirement
+from packaging.specifiers import SpecifierSet
 from packaging.version import Version, InvalidVersion
 from packaging.utils import InvalidWheelFilename
-from untangled_snakes import Identifier, Distribution, UnsupportedFileType
+from untangled_snakes import AppContext, Identifier, Distribution, UnsupportedFileType
+from untangled_snakes.candidate import Candidate
+from untangled_snakes.environments import Environment, split_platform
+from untangled_snakes.markers import MarkerEvaluator, parse_requirement
+from untangled_snakes.specifiers import ContainmentMemo, parse_specifier
+from untangled_snakes.versions import VersionIndex
 
 identifier_expectations = [
     ("pytest", ("pytest", ())),
@@ -52,3 +58,178 @@ def test_broken_and_unsupported():
         Distribution("broken.whl")
     with pytest.raises(InvalidVersion):
         Distribution("html5lib-1.0-reupload.tar.gz")
+
+
+def test_distribution_interns_versions():
+    versions = dict()
+    wheel = Distribution("PySocks-1.7.1-py27-none-any.whl", versions)
+    sdist = Distribution("PySocks-1.7.1.tar.gz", versions)
+    assert wheel.version is sdist.version
+    assert wheel.build == sdist.build == ()
+
+
+version_index_specifiers = [
+    "",
+    ">=1.0",
+    "<2.0",
+    ">=1.0,<2.0",
+    "==1.0",
+    "==1.*",
+    "~=1.0",
+    "!=1.0,<=2.0",
+    "==1.0+local",
+    ">=3",
+    "<0.1",
+]
+
+
+@pytest.mark.parametrize("specifier", version_index_specifiers)
+def test_version_index_bounds(specifier):
+    class FakeCandidate:
+        def __init__(self, version):
+            self.version = Version(version)
+
+    versions = ["0.9", "1.0rc1", "1.0", "1.0+local", "1.0.post1", "1.5", "2.0"]
+    candidates = [FakeCandidate(v) for v in versions * 2]
+    index = VersionIndex(candidates)
+    specifier_set = SpecifierSet(specifier)
+    lo, hi = index.bounds([specifier_set])
+    matched = [c for c in index.descending(lo, hi) if c.version in specifier_set]
+    expected = sorted(
+        (c for c in candidates if c.version in specifier_set),
+        key=lambda c: c.version,
+        reverse=True,
+    )
+    assert matched == expected
+
+
+def test_version_index_releases():
+    filenames = [
+        "foo-1.0.tar.gz",
+        "foo-1.0-py3-none-any.whl",
+        "foo-1.0-cp311-cp311-manylinux_2_17_x86_64.whl",
+        "foo-2.0.tar.gz",
+    ]
+    app_context = AppContext()
+    candidates = [
+        Candidate(
+            app_context, Distribution(f), url=f, core_metadata=f.endswith("x86_64.whl")
+        )
+        for f in filenames
+    ]
+    index = VersionIndex(candidates).releases()
+    assert [str(c.version) for c in index] == ["1.0", "2.0"]
+    release, sdist = index
+    # locked to the first file, metadata from the one with PEP 658 metadata
+    assert release.url == "foo-1.0.tar.gz"
+    assert release.files == tuple(candidates[:3])
+    assert release.base is candidates[2]
+    assert release.with_extras(["bar"]).files == release.files
+    assert sdist is candidates[3]
+    app_context.close()
+
+
+def test_version_index_releases_legacy_metadata(monkeypatch):
+    app_context = AppContext(legacy_metadata=["foo"])
+    submitted = []
+    monkeypatch.setattr(app_context.sdist_builder, "submit", submitted.append)
+    filenames = ["foo-1.0-py3-none-any.whl", "foo-1.0.tar.gz"]
+    candidates = [
+        Candidate(app_context, Distribution(f), url=f, core_metadata=True)
+        for f in filenames
+    ]
+    (release,) = VersionIndex(candidates).releases()
+    # locked to the wheel, but metadata is built from the sdist
+    assert release.url == "foo-1.0-py3-none-any.whl"
+    assert release.base is candidates[1]
+    release.prepare_metadata()
+    assert submitted == [candidates[1]]
+    app_context.close()
+
+
+def test_marker_evaluator():
+    evaluator = MarkerEvaluator({"sys_platform": "linux"})
+    requirement = parse_requirement('PySocks!=1.5.7,>=1.5.6; extra == "socks"')
+    assert requirement is parse_requirement('PySocks!=1.5.7,>=1.5.6; extra == "socks"')
+    assert evaluator.evaluate(requirement.marker, "socks") is True
+    assert evaluator.evaluate(requirement.marker, "") is False
+    assert len(evaluator.cache) == 2
+    linux = parse_requirement('foo; sys_platform == "linux"')
+    assert evaluator.evaluate(linux.marker) is True
+
+
+environment_expectations = [
+    ("numpy-1.26.0-cp311-cp311-manylinux_2_17_x86_64.whl", None, True, False),
+    ("numpy-1.26.0-cp311-cp311-manylinux_2_17_aarch64.whl", None, False, False),
+    ("numpy-1.26.0-cp311-cp311-macosx_11_0_arm64.whl", None, False, True),
+    ("numpy-1.26.0-cp312-cp312-manylinux_2_17_x86_64.whl", None, False, False),
+    ("six-1.16.0-py2.py3-none-any.whl", None, True, True),
+    ("idna-3.4.tar.gz", None, True, True),
+    ("idna-3.4.tar.gz", ">=3.12", False, False),
+]
+
+
+@pytest.mark.parametrize(
+    "filename,requires_python,linux,darwin", environment_expectations
+)
+def test_environment_supports(filename, requires_python, linux, darwin):
+    candidate = Candidate(
+        None, Distribution(filename), index_requires_python=requires_python
+    )
+    assert (
+        Environment.from_platform("x86_64-linux", "3.11").supports(candidate) is linux
+    )
+    assert (
+        Environment.from_platform("aarch64-darwin", "3.11").supports(candidate)
+        is darwin
+    )
+
+
+def test_environment_macos_version():
+    candidate = Candidate(
+        None, Distribution("numpy-2.1.0-cp312-cp312-macosx_14_0_arm64.whl")
+    )
+    assert not Environment.from_platform("aarch64-darwin", "3.12").supports(candidate)
+    darwin = Environment.from_platform("aarch64-darwin@14.0", "3.12")
+    assert darwin.name == "aarch64-darwin@14.0"
+    assert darwin.supports(candidate)
+    # wheels for older macOS versions are still accepted
+    older = Candidate(None, Distribution("six-1.0-cp312-cp312-macosx_11_0_arm64.whl"))
+    assert Environment.from_platform("aarch64-darwin@15", "3.12").supports(older)
+    assert split_platform("x86_64-darwin@12") == ("x86_64-darwin", (12, 0))
+    assert split_platform("env.json") == (None, None)
+    with pytest.raises(ValueError):
+        split_platform("x86_64-linux@14.0")
+
+
+def test_environment_markers():
+    linux = Environment.from_platform("aarch64-linux", "3.10")
+    darwin = Environment.from_platform("aarch64-darwin", "3.12")
+    requirement = parse_requirement(
+        'foo; platform_machine == "aarch64" and python_version < "3.11"'
+    )
+    assert linux.marker_evaluator.evaluate(requirement.marker) is True
+    assert darwin.marker_evaluator.evaluate(requirement.marker) is False
+    assert darwin.marker_evaluator.environment["python_full_version"] == "3.12.0"
+
+
+def test_containment_memo():
+    # equal specifiers of requirements are shared
+    first = parse_requirement("foo>=1.0,<2")
+    second = parse_requirement("bar<2,>=1.0")
+    assert first.specifier is second.specifier is parse_specifier("<2,>=1.0")
+
+    memo = ContainmentMemo(maxsize=2)
+    versions = [Version("1.5"), Version("2.0"), Version("0.9")]
+    assert [memo.contains(first.specifier, v) for v in versions] == [
+        True,
+        False,
+        False,
+    ]
+    assert len(memo.cache) == 1
+    assert memo.contains(first.specifier, versions[2]) is False
+
+    environment = Environment.host("3.8")
+    assert environment.marker_evaluator.environment["python_version"] == "3.8"
+    assert environment.supports_python(">=3.7,<3.9")
+    assert not environment.supports_python(">=3.9")
@@ -0,0 +1,181 @@
+import os
+import re
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from io import BytesIO
+from zipfile import ZipFile
+
+import pytest
+
+from untangled_snakes import AppContext, Distribution
+from untangled_snakes.builds import SdistBuilder
+from untangled_snakes.candidate import Candidate
+from untangled_snakes.lazy_wheel import HTTPRangeFile, open_wheel
+from untangled_snakes.metadata import (
+    MetadataHashMismatch,
+    fetch_metadata,
+    metadata_from_pep658,
+    parse_metadata,
+)
+from untangled_snakes.transport import RequestsTransport
+
+URL = "https://files.example.com/foo-1.0-py3-none-any.whl"
+METADATA = b"Metadata-Version: 2.1\nName: foo\nVersion: 1.0\n\n"
+
+
+def candidate(core_metadata):
+    return Candidate(
+        AppContext(),
+        Distribution("foo-1.0-py3-none-any.whl"),
+        url=URL,
+        core_metadata=core_metadata,
+    )
+
+
+def test_pep658_not_advertised(requests_mock):
+    assert metadata_from_pep658(candidate(False)) is None
+    assert requests_mock.call_count == 0
+
+
+def test_pep658_verified(requests_mock):
+    requests_mock.get(f"{URL}.metadata", content=METADATA)
+    hashes = {"sha256": sha256(METADATA).hexdigest()}
+    metadata = metadata_from_pep658(candidate(hashes))
+    assert metadata["Name"] == "foo"
+
+
+def test_pep658_hash_mismatch(requests_mock):
+    requests_mock.get(f"{URL}.metadata", content=METADATA)
+    with pytest.raises(MetadataHashMismatch):
+        metadata_from_pep658(candidate({"sha256": "0" * 64}))
+
+
+def test_pep658_missing(requests_mock):
+    requests_mock.get(f"{URL}.metadata", status_code=404)
+    assert metadata_from_pep658(candidate(True)) is None
+
+
+def serve_ranges(content):
+    def callback(request, context):
+        match = re.match(r"bytes=(\d*)-(\d*)", request.headers.get("Range", ""))
+        if not match:
+            return content
+        start, end = match.groups()
+        if not start:
+            start, end = len(content) - int(end), len(content) - 1
+        start, end = int(start), min(int(end or len(content) - 1), len(content) - 1)
+        context.status_code = 206
+        context.headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+        return content[start : end + 1]
+
+    return callback
+
+
+def build_wheel():
+    buffer = BytesIO()
+    with ZipFile(buffer, "w") as zip:
+        zip.writestr("foo-1.0.dist-info/METADATA", METADATA)
+        zip.writestr("foo/data.bin", os.urandom(1024 * 1024))
+        zip.writestr("foo-1.0.dist-info/RECORD", b"")
+    return buffer.getvalue()
+
+
+def test_lazy_wheel(requests_mock):
+    wheel = build_wheel()
+    requests_mock.get(URL, content=serve_ranges(wheel))
+    with open_wheel(RequestsTransport(), URL) as f:
+        assert isinstance(f, HTTPRangeFile)
+        with ZipFile(f) as zip:
+            metadata = parse_metadata(zip.open("foo-1.0.dist-info/METADATA"))
+        assert f.downloaded < len(wheel) / 10
+    assert metadata["Name"] == "foo"
+
+
+def test_lazy_wheel_without_ranges(requests_mock):
+    wheel = build_wheel()
+    requests_mock.get(URL, content=wheel)
+    metadata = fetch_metadata(candidate(False))
+    assert metadata["Name"] == "foo"
+    assert requests_mock.call_count == 1
+
+
+def test_lazy_wheel_ranges_stop(requests_mock):
+    wheel = build_wheel()
+    ranges = serve_ranges(wheel)
+    requests = []
+
+    def callback(request, context):
+        requests.append(request.headers.get("Range"))
+        if len(requests) == 1:
+            return ranges(request, context)
+        # later range requests get the whole file
+        return wheel
+
+    requests_mock.get(URL, content=callback)
+    metadata = fetch_metadata(candidate(False))
+    assert metadata["Name"] == "foo"
+    assert requests[0] == "bytes=-65536"
+    assert requests[-1] is None
+
+
+class CountingBytesIO(BytesIO):
+    consumed = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.consumed += len(data)
+        return data
+
+
+def test_sdist_stops_at_pkg_info(requests_mock):
+    url = "https://files.example.com/foo-1.0.tar.gz"
+    buffer = BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name, content in [
+            ("foo-1.0/PKG-INFO", METADATA),
+            ("foo-1.0/data.bin", os.urandom(4 * 1024 * 1024)),
+        ]:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, BytesIO(content))
+    body = CountingBytesIO(buffer.getvalue())
+    requests_mock.get(url, body=body)
+
+    sdist = Candidate(AppContext(), Distribution("foo-1.0.tar.gz"), url=url)
+    assert fetch_metadata(sdist)["Name"] == "foo"
+    assert body.consumed < len(buffer.getvalue()) / 10
+
+
+def test_sdist_builder(monkeypatch):
+    builds = []
+
+    def build_metadata(url, distribution, transport_options):
+        builds.append((url, transport_options))
+        if url == "broken":
+            raise ConnectionError("transient")
+        return METADATA
+
+    monkeypatch.setattr("untangled_snakes.builds.build_metadata", build_metadata)
+    builder = SdistBuilder(transport_options={"retries": 0})
+    monkeypatch.setattr(builder, "_make_executor", lambda: ThreadPoolExecutor(2))
+
+    def sdist(url, sha256):
+        return Candidate(None, Distribution("foo-1.0.tar.gz"), url=url, sha256=sha256)
+
+    url = "https://files.example.com/foo-1.0.tar.gz"
+    # builds are deduplicated by sha256, or the URL without one
+    assert builder.submit(sdist(url, "abc")) is builder.submit(sdist("mirror", "abc"))
+    assert builder.metadata(sdist(url, "abc")) == METADATA
+    assert builder.metadata(sdist(url, None)) == METADATA
+    assert builds == [(url, {"retries": 0})] * 2
+    # builds are forgotten once their metadata was returned
+    assert builder.futures == {}
+
+    # failed builds are tried again
+    with pytest.raises(ConnectionError):
+        builder.metadata(sdist("broken", None))
+    with pytest.raises(ConnectionError):
+        builder.submit(sdist("broken", None)).result()
+    assert len(builds) == 4
+    builder.shutdown()
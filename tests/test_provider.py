@@ -1,9 +1,29 @@
+import gzip
+import json
+from io import StringIO
+from pathlib import Path
+
 from packaging.requirements import Requirement
+from resolvelib import Resolver
+from resolvelib.structs import RequirementInformation
 
 from untangled_snakes import (
+    AppContext,
     Identifier,
+    PyPiProvider,
+    SimpleIndexFinder,
     generate_lock,
+    generate_targets_lock,
+    resolve,
+    resolve_targets,
 )
+from untangled_snakes.environments import Environment
+from untangled_snakes.locks import locked_candidates
+from untangled_snakes.reporters import JsonReporter, SilentReporter
+
+from .conftest import build_distribution
+
+METADATA_PATH = Path("tests/cases/requests-socks/metadata")
 
 
 def test_requests(load_case, resolver):
@@ -28,3 +48,148 @@ def test_requests_without_socks(load_case, resolver):
         not in result.mapping
     )
     assert Identifier("pysocks") not in result.mapping
+
+
+def test_prefetch(load_case, resolver):
+    load_case("requests-socks")
+    resolver.resolve([Requirement("requests[socks]")])
+    prefetcher = resolver.provider.finder.prefetcher
+    resolver.provider.finder.close()
+    # only the root requirement is fetched on demand, all its
+    # dependencies are prefetched as soon as they are known.
+    assert prefetcher.misses == 1
+    assert prefetcher.hits + prefetcher.waits == 5
+    assert prefetcher.wasted == 0
+
+
+def test_extras_share_candidates(load_case, resolver, requests_mock):
+    load_case("requests-socks")
+    result = resolver.resolve([Requirement("requests"), Requirement("requests[socks]")])
+    assert Identifier("requests") in result.mapping
+    assert Identifier("requests", ("socks",)) in result.mapping
+    assert Identifier("pysocks") in result.mapping
+    requested = [r.url for r in requests_mock.request_history]
+    assert len([url for url in requested if url.endswith("/simple/requests")]) == 1
+    assert len([url for url in requested if "requests-2.31.0" in url]) == 1
+
+
+def test_preference():
+    provider = PyPiProvider(finder=None)
+    information = {
+        Identifier("a"): [RequirementInformation(Requirement("a>1"), None)],
+        Identifier("b"): [RequirementInformation(Requirement("b==1"), "parent")],
+        Identifier("c"): [RequirementInformation(Requirement("c"), "parent")],
+    }
+    causes = [RequirementInformation(Requirement("c<2"), None)]
+    preferences = {
+        identifier: provider.get_preference(identifier, {}, {}, information, causes)
+        for identifier in information
+    }
+    assert sorted(preferences, key=preferences.get) == [
+        Identifier("b"),
+        Identifier("a"),
+        Identifier("c"),
+    ]
+
+
+def test_json_reporter(load_case):
+    load_case("requests-socks")
+    stream = StringIO()
+    finder = SimpleIndexFinder(AppContext())
+    resolver = Resolver(PyPiProvider(finder), JsonReporter(stream))
+    resolver.resolve([Requirement("requests")])
+    finder.close()
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert events[0]["event"] == "starting"
+    assert events[-1]["event"] == "ending"
+    assert events[-1]["mapping"]["requests[]"] == "2.31.0"
+    assert "pinning" in {event["event"] for event in events}
+
+
+def test_profile(load_case, resolver):
+    load_case("requests-socks")
+    resolver.resolve([Requirement("requests[socks]")])
+    finder = resolver.provider.finder
+    finder.close()
+    report = finder.app_context.profile.report()
+    # charset-normalizer is locked to its sdist, but its metadata is read
+    # from a wheel of the release, via PEP 658
+    assert report["counters"]["metadata.pep658"] == 3
+    assert report["counters"]["metadata.wheel"] == 3
+    assert "metadata.sdist" not in report["counters"]
+    assert report["hit_rates"]["index.prefetch"] == round(5 / 6, 4)
+    assert report["timings"]["metadata.fetch"]["count"] == 6
+    assert report["bytes"]["metadata.pep658"] > 0
+
+
+def test_from_lock(load_case, requests_mock, tmp_path):
+    inputs, expected_lock = load_case("requests-socks")
+    requirements = [Requirement(r) for r in inputs["requirements"]]
+    # metadata of the first resolution is kept in the cache
+    app_context = AppContext(cache_dir=tmp_path)
+    resolve(app_context, requirements, SilentReporter())
+    requests_mock.reset_mock()
+
+    # re-locking unchanged requirements doesn't touch the network at all
+    app_context = AppContext(cache_dir=tmp_path)
+    locked = locked_candidates(app_context, expected_lock)
+    result = resolve(app_context, requirements, SilentReporter(), locked=locked)
+    assert generate_lock(result) == expected_lock
+    assert requests_mock.call_count == 0
+
+    # locked versions which don't satisfy the requirements are looked up
+    lock = json.loads(json.dumps(expected_lock))
+    lock["sources"]["certifi"]["version"] = "2022.12.7"
+    lock["sources"]["certifi"]["url"] = "https://example.com/certifi-2022.12.7.tar.gz"
+    locked = locked_candidates(app_context, lock)
+    requirements.append(Requirement("certifi>=2023"))
+    result = resolve(app_context, requirements, SilentReporter(), locked=locked)
+    assert generate_lock(result)["sources"] == expected_lock["sources"]
+    requested = [r.url for r in requests_mock.request_history]
+    assert requested == ["https://pypi.org/simple/certifi"]
+
+    # locked versions which don't support the Python version are looked up,
+    # which the lock's Requires-Python tells without fetching metadata
+    requests_mock.reset_mock()
+    app_context = AppContext()
+    locked = locked_candidates(app_context, expected_lock)
+    finder = SimpleIndexFinder(app_context)
+    urllib3 = Identifier("urllib3")
+    for python_version, supported in [("3.11", True), ("3.6", False)]:
+        provider = PyPiProvider(finder, locked, Environment.host(python_version))
+        match = provider._locked_match(urllib3, [], set())
+        assert (match is locked["urllib3"]) == supported
+    finder.close()
+    assert requests_mock.call_count == 0
+
+
+def test_targets(load_case, requests_mock):
+    inputs, expected_lock = load_case("requests-socks")
+    # the recorded lock has the py27 wheel of pysocks, which doesn't match the
+    # tags of the targets, serve the same metadata for its py3 wheel
+    with gzip.open(METADATA_PATH / "PySocks-1.7.1-py27-none-any.whl.metadata.gz") as f:
+        metadata = f.read()
+    py3_wheel = "PySocks-1.7.1-py3-none-any.whl"
+    py3_url = f"https://files.pythonhosted.org/packages/8d/59/b4572118e098ac8e46e399a1dd0f2d85403ce8bbaad9ec79373ed6badaf9/{py3_wheel}"
+    requests_mock.get(py3_url, content=build_distribution(py3_wheel, metadata))
+
+    requirements = [Requirement(r) for r in inputs["requirements"]]
+    app_context = AppContext()
+    environments = [
+        app_context.environment,
+        Environment.from_platform("x86_64-linux", "3.11"),
+        Environment.from_platform("aarch64-darwin", "3.11"),
+    ]
+    results = resolve_targets(app_context, requirements, environments)
+    lock = generate_targets_lock(results)
+    assert lock["sources"] == expected_lock["sources"]
+    assert lock["targets"] == {
+        "default": expected_lock["targets"]["default"],
+        "x86_64-linux": expected_lock["targets"]["default"],
+        "aarch64-darwin": expected_lock["targets"]["default"],
+    }
+    assert lock["target_sources"]["x86_64-linux"]["pysocks"]["url"] == py3_url
+    assert lock["target_sources"]["aarch64-darwin"]["pysocks"]["url"] == py3_url
+    # index pages and metadata are fetched once for all targets
+    requested = [r.url for r in requests_mock.request_history]
+    assert len(requested) == len(set(requested))
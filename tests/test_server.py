@@ -0,0 +1,143 @@
+import json
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from untangled_snakes import (
+    AppContext,
+    Identifier,
+    ResolverService,
+    SimpleIndexFinder,
+    main,
+)
+from untangled_snakes.server import BadRequest, ServerError, make_server, request
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def _serve(address):
+        service = ResolverService()
+        server = make_server(address, service)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append((server, service))
+        return server
+
+    yield _serve
+    for server, service in servers:
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+
+def test_serve(load_case, requests_mock, tmp_path, serve):
+    inputs, expected_lock = load_case("requests-socks")
+    address = str(tmp_path / "untangled_snakes.sock")
+    serve(address)
+
+    payload = {"requirements": inputs["requirements"]}
+    assert request(address, "POST", "/resolve", payload) == expected_lock
+
+    # the server's caches are warm
+    requests_mock.reset_mock()
+    output = tmp_path / "lock.json"
+    args = ["--server", address, "-o", str(output)]
+    for requirement in inputs["requirements"]:
+        args += ["-r", requirement]
+    main(args)
+    assert json.loads(output.read_text()) == expected_lock
+    assert requests_mock.call_count == 0
+
+    # requests with legacy metadata share index pages and other projects
+    payload["legacy_metadata"] = ["flask"]
+    assert request(address, "POST", "/resolve", payload) == expected_lock
+    assert requests_mock.call_count == 0
+
+    stats = request(address, "GET", "/stats")
+    assert stats["counters"]["memory.views.hit"] > 0
+
+    with pytest.raises(ServerError) as e:
+        request(address, "POST", "/resolve", {"requirements": ["requests>"]})
+    assert e.value.status == 400
+
+
+def test_serve_http(load_case, serve):
+    inputs, expected_lock = load_case("requests-socks")
+    server = serve("http://127.0.0.1:0")
+    address = f"http://127.0.0.1:{server.server_address[1]}"
+
+    payload = {"requirements": inputs["requirements"]}
+    assert request(address, "POST", "/resolve", payload) == expected_lock
+    with pytest.raises(ServerError) as e:
+        request(address, "POST", "/resolve", {"requirements": ["requests<0"]})
+    assert e.value.status == 422
+
+
+def test_serve_rejects_per_request_options(tmp_path):
+    with pytest.raises(SystemExit):
+        main(["serve", "--legacy-metadata", "foo", str(tmp_path / "socket")])
+
+
+def test_client_imports():
+    # the client doesn't need the resolver, which is slow to import
+    code = (
+        "import sys, untangled_snakes\n"
+        "untangled_snakes.server_address(['--server', 'socket'])\n"
+        "print(sorted({'build', 'requests', 'resolvelib', 'rich'} & set(sys.modules)))"
+    )
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+    assert output.strip() == "[]"
+
+
+def test_legacy_metadata_finders(load_case, requests_mock):
+    load_case("requests-socks")
+    service = ResolverService(max_legacy_finders=1)
+    app_context, finder = service._context(["idna"])
+    assert app_context.legacy_metadata == ["idna"]
+    assert app_context.transport is service.app_context.transport
+
+    # candidates of legacy projects are copies, of others the shared ones
+    idna = Identifier("idna")
+    candidates = list(finder.find_candidates(idna))
+    assert candidates[0].app_context is app_context
+    assert candidates[0] not in list(service.finder.find_candidates(idna))
+    # in the same order, and locked to the same files, as without a server
+    local_finder = SimpleIndexFinder(AppContext(legacy_metadata=["idna"]))
+    local = list(local_finder.find_candidates(idna))
+    assert [c.url for c in candidates] == [c.url for c in local]
+    assert [c.files[0].url for c in candidates if c.files] == [
+        c.files[0].url for c in local if c.files
+    ]
+    local_finder.close()
+    urllib3 = Identifier("urllib3")
+    assert list(finder.find_candidates(urllib3)) == list(
+        service.finder.find_candidates(urllib3)
+    )
+    assert requests_mock.call_count == 3
+
+    # only the most recently used legacy finders are kept
+    service._context(["pysocks"])
+    assert service._context(["idna"])[1] is not finder
+    service.close()
+
+
+def test_service_targets(tmp_path):
+    service = ResolverService(max_environments=1)
+    linux = service._environments(None, ["x86_64-linux"], "3.11")[0]
+    assert service._environments(None, ["x86_64-linux"], "3.11") == [linux]
+    inline = {"name": "inline", "python_version": "3.11", "markers": {}}
+    assert service._environments(None, [inline], None)[0].name == "inline"
+    # only the most recently used environments are kept
+    assert service._environments(None, ["x86_64-linux"], "3.11")[0] is not linux
+    darwin = service._environments(None, ["aarch64-darwin@14.0"], "3.12")[0]
+    assert darwin.name == "aarch64-darwin@14.0"
+
+    # clients can't make the server open its files
+    path = tmp_path / "target.json"
+    path.write_text(json.dumps(inline))
+    with pytest.raises(BadRequest):
+        service._environments(None, [str(path)], None)
+    service.close()
@@ -0,0 +1,37 @@
+import pytest
+from packaging.requirements import Requirement
+
+from untangled_snakes import AppContext, NotInSnapshot, generate_lock, main, resolve
+from untangled_snakes.reporters import SilentReporter
+from untangled_snakes.snapshot import Snapshot
+
+
+def test_snapshot(load_case, requests_mock, tmp_path):
+    inputs, expected_lock = load_case("requests-socks")
+    path = tmp_path / "snapshot.sqlite"
+    main(["snapshot", "--no-cache", *inputs_args(inputs), str(path)])
+    requests_mock.reset_mock()
+
+    snapshot = Snapshot(path)
+    assert snapshot.info("index_url") == "https://pypi.org/simple"
+    # charset-normalizer's metadata is kept for its sdist and for the wheel
+    # it was read from
+    assert snapshot.counts()["metadata"] == 7
+    with pytest.raises(NotInSnapshot):
+        snapshot.page("flask")
+    snapshot.close()
+
+    # resolving from the snapshot doesn't touch the network at all
+    app_context = AppContext(snapshot=path)
+    requirements = [Requirement(r) for r in inputs["requirements"]]
+    result = resolve(app_context, requirements, SilentReporter())
+    app_context.close()
+    assert generate_lock(result) == expected_lock
+    assert requests_mock.call_count == 0
+
+
+def inputs_args(inputs):
+    args = []
+    for requirement in inputs["requirements"]:
+        args += ["-r", requirement]
+    return args
@@ -0,0 +1,128 @@
+import gzip
+import json
+import threading
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from untangled_snakes import AppContext, Identifier, SimpleIndexFinder
+from untangled_snakes.instrumentation import Profile
+from untangled_snakes.transport import ChunkReader, RequestsTransport
+
+URL = "https://files.example.com/foo"
+
+
+def test_retries(requests_mock):
+    profile = Profile()
+    transport = RequestsTransport(retries=2, backoff=0, profile=profile)
+    requests_mock.get(
+        URL,
+        [
+            {"status_code": 503},
+            {"exc": requests.ConnectionError},
+            {"content": b"foo"},
+        ],
+    )
+    assert transport.get(URL).content == b"foo"
+    assert requests_mock.call_count == 3
+    assert profile.counters["transport.retries"] == 2
+
+    requests_mock.get(URL, status_code=502)
+    assert transport.get(URL).status_code == 502
+    requests_mock.get(URL, status_code=404)
+    assert transport.get(URL).status_code == 404
+    assert requests_mock.call_count == 3 + 3 + 1
+
+    requests_mock.get(URL, exc=requests.ConnectTimeout)
+    with pytest.raises(requests.ConnectTimeout):
+        transport.get(URL)
+
+
+def test_stream(requests_mock):
+    content = b"foo" * 1024
+    requests_mock.get(
+        URL, content=gzip.compress(content), headers={"Content-Encoding": "gzip"}
+    )
+    with RequestsTransport().stream(URL) as f:
+        assert f.read() == content
+
+
+def test_chunk_reader():
+    chunks = iter([b"abc", b"", b"defg"])
+    reader = ChunkReader(lambda: next(chunks, None))
+    assert reader.read(2) == b"ab"
+    assert reader.read(3) == b"c"
+    assert reader.read() == b"defg"
+    assert reader.read() == b""
+    assert reader.tell() == 7
+
+
+class IndexHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        content, headers = self.server.responses[self.path]
+        etag = headers.get("ETag")
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def local_index():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), IndexHandler)
+    server.daemon_threads = True
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    metadata = b"Metadata-Version: 2.1\nName: foo\nVersion: 1.0\nRequires-Dist: bar\n"
+    page = {
+        "meta": {"api-version": "1.1"},
+        "name": "foo",
+        "files": [
+            {
+                "filename": "foo-1.0-py3-none-any.whl",
+                "url": f"{url}/files/foo-1.0-py3-none-any.whl",
+                "hashes": {},
+                "core-metadata": {"sha256": sha256(metadata).hexdigest()},
+            }
+        ],
+    }
+    json_type = {"Content-Type": "application/vnd.pypi.simple.v1+json"}
+    server.responses = {
+        "/simple/foo": (json.dumps(page).encode(), {"ETag": '"v1"', **json_type}),
+        "/files/foo-1.0-py3-none-any.whl.metadata": (metadata, {}),
+    }
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"{url}/simple"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("transport", ["httpx", "httpx-async"])
+def test_httpx_finder(local_index, tmp_path, transport):
+    pytest.importorskip("httpx")
+
+    def find():
+        app_context = AppContext(transport=transport, cache_dir=tmp_path)
+        finder = SimpleIndexFinder(app_context, index_url=local_index)
+        (candidate,) = finder.find_candidates(Identifier("foo"))
+        dependencies = [str(r) for r in candidate.dependencies]
+        finder.close()
+        app_context.close()
+        return dependencies, app_context.profile.counters
+
+    assert find()[0] == ["bar"]
+    # the cached page is revalidated, metadata is read from the store
+    dependencies, counters = find()
+    assert dependencies == ["bar"]
+    assert counters["index.cache.revalidated"] == 1
+    assert counters["metadata.store.hit"] == 1
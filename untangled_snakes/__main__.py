@@ -1,3 +1,5 @@
 from . import main
 
-main()
+# build workers are spawned, and import the main module again
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,99 @@
+import copy
 from pathlib import Path
 
+from .builds import SdistBuilder
+from .cache import IndexCache, MetadataStore
+from .instrumentation import Profile
+from .lru import LRUCache
+from .metadata import metadata_size
+from .transport import make_transport
+from .environments import Environment
+from .snapshot import Snapshot
+
 
 class AppContext:
-    def __init__(self, record_test_case=None, legacy_metadata=[]):
+    def __init__(
+        self,
+        record_test_case=None,
+        legacy_metadata=[],
+        prefetch_workers=8,
+        cache_dir=None,
+        index_max_age=None,
+        build_workers=None,
+        transport="requests",
+        pool_size=None,
+        retries=3,
+        timeout=30.0,
+        index_url="https://pypi.org/simple",
+        catalog_path=None,
+        snapshot=None,
+        record_snapshot=None,
+        python_version=None,
+        max_projects=None,
+        max_metadata_bytes=None,
+    ):
         self.record_test_case = record_test_case
         self.legacy_metadata = legacy_metadata
+        self.prefetch_workers = prefetch_workers
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        # a simple index, or a local directory of distribution files
+        self.index_url = index_url.rstrip("/")
+        self.catalog_path = catalog_path
+        # the environment to lock for, unless targets are given explicitly
+        self.environment = Environment.host(python_version)
+        self.profile = Profile()
+        # all network I/O goes through this, the pool needs to be large enough
+        # to keep a connection alive for each thread fetching concurrently.
+        transport_options = dict(
+            name=transport,
+            pool_size=pool_size or max(16, 2 * prefetch_workers),
+            retries=retries,
+            timeout=timeout,
+        )
+        self.transport = make_transport(**transport_options, profile=self.profile)
+        # build workers download sdists with a transport of their own
+        self.sdist_builder = SdistBuilder(build_workers, transport_options)
+
+        self.index_cache = None
+        self.metadata_store = None
+        if self.cache_dir:
+            self.index_cache = IndexCache(self.cache_dir / "index", index_max_age)
+            self.metadata_store = MetadataStore(self.cache_dir / "metadata")
+
+        # bounds of what's kept in memory, for long running processes. Evicted
+        # projects and metadata are looked up again, preferably in the caches
+        # above.
+        self.max_projects = max_projects
+        self.metadata_cache = LRUCache(
+            "memory.metadata",
+            max_bytes=max_metadata_bytes,
+            sizeof=metadata_size,
+            profile=self.profile,
+        )
+
+        # resolve from a snapshot instead of the network, or capture one
+        self.snapshot = Snapshot(snapshot) if snapshot else None
+        self.record_snapshot = None
+        if record_snapshot:
+            self.record_snapshot = Snapshot(record_snapshot, writable=True)
+            self.record_snapshot.set_info("index_url", self.index_url)
+
+    def with_legacy_metadata(self, legacy_metadata):
+        """Return a copy using legacy metadata for other packages.
+
+        It shares everything else with this app context, including its
+        transport, caches and builder, so only this one needs to be closed.
+        """
+        app_context = copy.copy(self)
+        app_context.legacy_metadata = legacy_metadata
+        return app_context
+
+    def close(self):
+        self.sdist_builder.shutdown()
+        self.transport.close()
+        for snapshot in (self.snapshot, self.record_snapshot):
+            if snapshot:
+                snapshot.close()
 
     @property
     def test_case_path(self):
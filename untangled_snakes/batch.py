@@ -0,0 +1,93 @@
+import json
+import logging
+import re
+from pathlib import Path
+
+from packaging.requirements import Requirement
+
+log = logging.getLogger(__name__)
+
+
+class BatchJob:
+    """A named set of requirements, locked to its own output file."""
+
+    def __init__(self, name, requirements, output):
+        self.name = name
+        self.requirements = requirements
+        self.output = Path(output)
+
+    def __repr__(self):
+        return f"<BatchJob {self.name}>"
+
+    def write_lock(self, lock):
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.output, "w") as f:
+            json.dump(lock, f, indent=2)
+
+
+# as pip's, comments start lines or follow whitespace, so that URL fragments
+# like #sha256=... or #egg=... aren't comments
+COMMENT_RE = re.compile(r"(^|\s)#.*$")
+# options of requirements files which include further requirements
+INCLUDE_OPTIONS = ("-r", "--requirement", "-c", "--constraint", "-e", "--editable")
+
+
+def read_requirements_file(path):
+    """Read requirement lines, ignoring blank lines and comments.
+
+    Other options than those including requirements, like --index-url or
+    --hash of a requirement, are ignored. Including requirements raises
+    ValueError, those are to be listed in the file themselves.
+    """
+    requirements = []
+    with open(path) as f:
+        for number, line in enumerate(f, start=1):
+            line = COMMENT_RE.sub("", line).strip()
+            if line.startswith(INCLUDE_OPTIONS):
+                raise ValueError(
+                    f"{path}:{number}: {line!r} includes requirements, which "
+                    "isn't supported, list them in the file instead"
+                )
+            if line.startswith("-"):
+                log.warning(f"{path}:{number}: ignoring option {line!r}")
+                continue
+            # options following requirements, like --hash=sha256:...
+            line = re.split(r"\s--", line, maxsplit=1)[0].strip()
+            if line:
+                requirements.append(Requirement(line))
+    return requirements
+
+
+def read_manifest(path, output_dir):
+    """Return a BatchJob for each set of requirements in the manifest.
+
+    A manifest is either a directory, in which every *.txt file is a list of
+    requirements, or a JSON lines file with objects like
+    `{"name": "web", "requirements": ["requests"], "output": "web.json"}`.
+    Locks are written to output_dir, as NAME.json unless "output" is given.
+    """
+    path = Path(path)
+    output_dir = Path(output_dir)
+    if path.is_dir():
+        return [
+            BatchJob(p.stem, read_requirements_file(p), output_dir / f"{p.stem}.json")
+            for p in sorted(path.glob("*.txt"))
+        ]
+
+    jobs = []
+    with open(path) as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line)
+            name = entry.get("name", str(number))
+            requirements = [Requirement(r) for r in entry["requirements"]]
+            output = output_dir / entry.get("output", f"{name}.json")
+            jobs.append(BatchJob(name, requirements, output))
+
+    outputs = [job.output for job in jobs]
+    duplicates = {str(output) for output in outputs if outputs.count(output) > 1}
+    if duplicates:
+        raise ValueError(f"{path} writes more than one lock to {duplicates}")
+    return jobs
@@ -0,0 +1,157 @@
+import logging
+import multiprocessing
+import shutil
+import tarfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing.util import Finalize
+from pathlib import Path
+from tempfile import TemporaryDirectory, TemporaryFile
+
+from build import ProjectBuilder
+from build.env import DefaultIsolatedEnv
+from pyproject_hooks import quiet_subprocess_runner
+
+from .transport import make_transport
+
+log = logging.getLogger(__name__)
+
+
+class SdistBuilder:
+    """Prepare metadata of sdists in a pool of worker processes.
+
+    Builds are deduplicated by the sdists sha256 (or URL), so that a build
+    started speculatively via `submit` is picked up by `metadata` later on.
+    Builds are forgotten once `metadata` returned their result, which the
+    caller keeps, or once they failed, so that they're tried again.
+    Workers download sdists with a transport made from `transport_options`,
+    as passed to `make_transport`.
+    """
+
+    def __init__(self, max_workers=None, transport_options=None):
+        self.max_workers = max_workers
+        self.transport_options = transport_options or {}
+        self.executor = None
+        self.futures = dict()
+        self.lock = threading.Lock()
+
+    def _key(self, candidate):
+        return candidate.sha256 or candidate.url
+
+    def submit(self, candidate):
+        key = self._key(candidate)
+        with self.lock:
+            future = self.futures.get(key)
+            if future is not None:
+                return future
+            log.info(f"preparing metadata for {candidate} in the background")
+            if self.executor is None:
+                self.executor = self._make_executor()
+            future = self.futures[key] = self.executor.submit(
+                build_metadata,
+                candidate.url,
+                candidate.distribution,
+                self.transport_options,
+            )
+        future.add_done_callback(lambda future: self._forget(key, future, True))
+        return future
+
+    def _forget(self, key, future, failed=False):
+        if failed and (future.cancelled() or future.exception() is None):
+            return
+        with self.lock:
+            if self.futures.get(key) is future:
+                del self.futures[key]
+
+    def _make_executor(self):
+        # the pool is started lazily, once prefetch and transport threads are
+        # running, which forked workers would inherit in an undefined state
+        context = multiprocessing.get_context("spawn")
+        return ProcessPoolExecutor(self.max_workers, mp_context=context)
+
+    def metadata(self, candidate):
+        """Return the contents of METADATA as prepared by the sdists build backend."""
+        future = self.submit(candidate)
+        try:
+            return future.result()
+        finally:
+            self._forget(self._key(candidate), future)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Isolated build environments of the current worker process, keyed by
+# the requirements installed into them, and nothing else.
+_environments = dict()
+# HTTP transport of the current worker process
+_transport = None
+
+
+def _environment(requires):
+    key = frozenset(requires)
+    if key not in _environments:
+        env = DefaultIsolatedEnv()
+        env.__enter__()
+        # multiprocessing workers don't run atexit handlers, but finalizers
+        Finalize(env, env.__exit__, args=(None, None, None), exitpriority=10)
+        env.install(sorted(requires))
+        _environments[key] = env
+    return _environments[key]
+
+
+def build_metadata(url, distribution, transport_options={}):
+    """Download the sdist at url and prepare its metadata, in a worker process.
+
+    Isolated environments are reused for all builds with the same
+    build-system requirements. Builds needing further requirements get one
+    with both installed, never the shared one with more installed into it, so
+    that metadata doesn't depend on which sdists were built before.
+    """
+    global _transport
+    if _transport is None:
+        _transport = make_transport(**transport_options)
+    with TemporaryFile() as distribution_file:
+        with _transport.stream(url) as f:
+            shutil.copyfileobj(f, distribution_file)
+
+        with source_tree_from_sdist(distribution, distribution_file) as source_tree:
+            requires = ProjectBuilder(source_tree).build_system_requires
+            env = _environment(requires)
+            builder = ProjectBuilder.from_isolated_env(
+                env, source_tree, runner=quiet_subprocess_runner
+            )
+            requires_for_build = set(builder.get_requires_for_build("wheel"))
+            if requires_for_build - set(requires):
+                env = _environment(set(requires) | requires_for_build)
+                builder = ProjectBuilder.from_isolated_env(
+                    env, source_tree, runner=quiet_subprocess_runner
+                )
+            with TemporaryDirectory() as temp_dir:
+                path = Path(builder.metadata_path(temp_dir))
+                return (path / "METADATA").read_bytes()
+
+
+@contextmanager
+def source_tree_from_sdist(distribution, distribution_file):
+    filename = distribution.filename
+    name_underscore = distribution.name.replace("-", "_")
+    search_dirs = [
+        f"{distribution.name}-{distribution.version}",
+        f"{name_underscore}-{distribution.version}",
+    ]
+    distribution_file.seek(0)
+    with (
+        tarfile.open(filename, fileobj=distribution_file) as tar,
+        TemporaryDirectory(suffix=f"metadata-preparation-{filename}") as temp_dir,
+    ):
+        tar.extractall(temp_dir, filter="data")
+        temp_dir = Path(temp_dir)
+
+        for search_dir in search_dirs:
+            if (temp_dir / search_dir).exists():
+                temp_dir = temp_dir / search_dir
+
+        yield temp_dir
@@ -0,0 +1,132 @@
+import gzip
+import json
+import logging
+import os
+import time
+from email.message import Message
+from hashlib import sha256
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+log = logging.getLogger(__name__)
+
+
+def default_cache_dir():
+    xdg_cache_home = os.environ.get("XDG_CACHE_HOME")
+    if xdg_cache_home:
+        return Path(xdg_cache_home) / "untangled_snakes"
+    return Path.home() / ".cache" / "untangled_snakes"
+
+
+def write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile("wb", dir=path.parent, delete=False) as f:
+        f.write(data)
+    os.replace(f.name, path)
+
+
+class IndexCache:
+    """Persistent cache for simple-index JSON pages.
+
+    Entries are keyed by index URL and project name and store the validators
+    sent by the server, so that stale entries can be revalidated with a
+    conditional request. Entries younger than `max_age` seconds are used
+    without revalidation.
+    """
+
+    def __init__(self, path, max_age=None):
+        self.path = Path(path)
+        self.max_age = max_age
+
+    def _path(self, index_url, name):
+        index = sha256(index_url.encode()).hexdigest()[:16]
+        return self.path / index / f"{name}.json"
+
+    def load(self, index_url, name):
+        try:
+            with open(self._path(index_url, name), "rb") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            log.warning(f"ignoring broken cache entry for {name}: {e}")
+            return None
+
+    def is_fresh(self, entry):
+        if self.max_age is None:
+            return False
+        return time.time() - entry["fetched"] < self.max_age
+
+    def conditional_headers(self, entry):
+        headers = dict()
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last-modified"):
+            headers["If-Modified-Since"] = entry["last-modified"]
+        return headers
+
+    def store(self, index_url, name, response, data):
+        entry = {
+            "url": str(response.url),
+            "etag": response.headers.get("ETag"),
+            "last-modified": response.headers.get("Last-Modified"),
+            "fetched": time.time(),
+            "data": data,
+        }
+        write_atomic(self._path(index_url, name), json.dumps(entry).encode())
+
+    def refresh(self, index_url, name, entry):
+        entry["fetched"] = time.time()
+        write_atomic(self._path(index_url, name), json.dumps(entry).encode())
+
+
+class MetadataStore:
+    """Persistent, content-addressed store for core metadata.
+
+    Distribution files are immutable, so their metadata is stored forever,
+    keyed by the files sha256 or, if the index didn't provide one, its URL.
+    Only the headers are kept, compressed as a JSON list of pairs.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def _path(self, candidate):
+        key = metadata_key(candidate)
+        return self.path / key[:2] / f"{key}.json.gz"
+
+    def get(self, candidate):
+        try:
+            with open(self._path(candidate), "rb") as f:
+                return decode_metadata(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError) as e:
+            log.warning(f"ignoring broken metadata entry for {candidate}: {e}")
+            return None
+
+    def put(self, candidate, metadata):
+        write_atomic(self._path(candidate), encode_metadata(metadata))
+
+
+def metadata_key(candidate):
+    """Return the sha256 of a candidate's file, or if unknown, of its URL."""
+    key = candidate.sha256 or sha256(candidate.url.encode()).hexdigest()
+    # metadata prepared by evaluating setup.py is stored separately,
+    # as it differs from the files own metadata.
+    if candidate.name in candidate.app_context.legacy_metadata:
+        key = f"{key}-legacy"
+    return key
+
+
+def encode_metadata(metadata):
+    """Return the headers of metadata, compressed as a JSON list of pairs."""
+    headers = json.dumps(list(metadata.items()), separators=(",", ":"))
+    return gzip.compress(headers.encode())
+
+
+def decode_metadata(data):
+    metadata = Message()
+    for key, value in json.loads(gzip.decompress(data)):
+        metadata[key] = value
+    return metadata
@@ -1,24 +1,120 @@
-from packaging.requirements import Requirement
-from .metadata import fetch_metadata
+import copy
+import threading
+
+from .cache import metadata_key
+from .markers import parse_requirement
+from .metadata import fetch_metadata, prepare_metadata
 from .test_cases import record_metadata
 
+# Candidates are shared between concurrent resolutions, make sure each one's
+# metadata is only fetched once at a time. Locks are striped, to not need one
+# per candidate.
+METADATA_LOCKS = [threading.Lock() for _ in range(64)]
+
 
 class Candidate:
-    def __init__(self, app_context, distribution, url=None, sha256=None, extras=None):
+    __slots__ = (
+        "app_context",
+        "distribution",
+        "url",
+        "sha256",
+        "extras",
+        "core_metadata",
+        "index_requires_python",
+        "base",
+        "files",
+        "_dependencies",
+    )
+
+    def __init__(
+        self,
+        app_context,
+        distribution,
+        url=None,
+        sha256=None,
+        extras=None,
+        core_metadata=False,
+        index_requires_python=None,
+        base=None,
+        files=None,
+    ):
         self.app_context = app_context
         self.distribution = distribution
         self.url = url
         self.sha256 = sha256
-        self.extras = extras
+        self.extras = tuple(extras) if extras else ()
+        # PEP 658: either a bool or a dict of hashes of the metadata file
+        self.core_metadata = core_metadata
+        # requires-python of the file as given by the index
+        self.index_requires_python = index_requires_python
+        # candidates with extras share metadata with the candidate without,
+        # candidates of a release with the file it is read from.
+        self.base = base
+        # all files of a release, in index order, the first one is locked
+        self.files = files
 
-        self._metadata = None
-        self._dependencies = None
+        # dependencies by marker evaluator of the environment
+        self._dependencies = dict()
 
     def __repr__(self):
         if not self.extras:
             return f"<{self.name}=={self.version}>"
         return f"<{self.name}[{','.join(self.extras)}]=={self.version}>"
 
+    def with_extras(self, extras):
+        """Return a view on this candidate, activating the given extras."""
+        if not extras:
+            return self
+        return Candidate(
+            self.app_context,
+            self.distribution,
+            url=self.url,
+            sha256=self.sha256,
+            extras=extras,
+            core_metadata=self.core_metadata,
+            index_requires_python=self.index_requires_python,
+            base=self,
+            files=self.files,
+        )
+
+    def with_app_context(self, app_context):
+        """Return a copy of this candidate for another app context."""
+        candidate = copy.copy(self)
+        candidate.app_context = app_context
+        candidate._dependencies = dict()
+        return candidate
+
+    @classmethod
+    def for_release(cls, files):
+        """Return a single candidate for files of a release, in index order.
+
+        It is locked to the first file, but its metadata is read from the file
+        for which that is cheapest, assuming all files of a release share it.
+        Except for projects with legacy metadata, which is read from the sdist.
+        """
+        first = files[0]
+        if len(files) == 1:
+            return first
+        if first.name in first.app_context.legacy_metadata:
+            # metadata of legacy projects is built from their sdist, whatever
+            # their wheels say
+            preferred = min(files, key=lambda f: not f.is_sdist)
+        else:
+            # PEP 658 metadata is a single small download, the metadata of
+            # wheels can be read with range requests, sdists may need to be
+            # built.
+            preferred = min(files, key=lambda f: (not f.has_core_metadata, f.is_sdist))
+        return Candidate(
+            first.app_context,
+            first.distribution,
+            url=first.url,
+            sha256=first.sha256,
+            core_metadata=first.core_metadata,
+            index_requires_python=first.index_requires_python,
+            base=preferred,
+            files=tuple(files),
+        )
+
     @property
     def name(self):
         return self.distribution.name
@@ -35,34 +131,96 @@ class Candidate:
     def is_sdist(self):
         return self.distribution.is_sdist
 
+    @property
+    def has_core_metadata(self):
+        return bool(self.core_metadata)
+
+    @property
+    def core_metadata_hashes(self):
+        if isinstance(self.core_metadata, dict):
+            return self.core_metadata
+        return {}
+
     @property
     def metadata(self):
-        if self._metadata is None:
-            self._metadata = fetch_metadata(self)
-            if self.app_context.record_test_case:
-                record_metadata(
-                    self.app_context, self.distribution.filename, self._metadata
-                )
-        return self._metadata
+        """Metadata of the candidate, kept in the app context's metadata cache.
+
+        It is keyed by the candidate's file, like in the metadata store, so
+        that candidates created again for the same file share it. Once
+        evicted from it, metadata is fetched again, usually from the
+        metadata store.
+        """
+        if self.base is not None:
+            return self.base.metadata
+        cache = self.app_context.metadata_cache
+        key = metadata_key(self)
+        metadata = cache.get(key)
+        if metadata is None:
+            with METADATA_LOCKS[hash(key) % len(METADATA_LOCKS)]:
+                metadata = cache.peek(key)
+                if metadata is None:
+                    metadata = cache.setdefault(key, self._fetch_metadata())
+        return metadata
+
+    def _fetch_metadata(self):
+        metadata = fetch_metadata(self)
+        if self.app_context.record_test_case:
+            record_metadata(self.app_context, self.distribution.filename, metadata)
+        if self.app_context.record_snapshot:
+            self.app_context.record_snapshot.add_metadata(self, metadata)
+        return metadata
+
+    def keep_locked_metadata(self):
+        """Store metadata read from another file of the release for this one.
+
+        Locks only know the file a candidate is locked to, re-locking from
+        them looks its metadata up by that file.
+        """
+        source = self
+        while source.base is not None:
+            source = source.base
+        if source.url == self.url:
+            return
+        store = self.app_context.metadata_store
+        if store and store.get(self) is None:
+            store.put(self, self.metadata)
+        if self.app_context.record_snapshot:
+            self.app_context.record_snapshot.add_metadata(self, self.metadata)
+
+    def prepare_metadata(self):
+        if self.base is not None:
+            return self.base.prepare_metadata()
+        if metadata_key(self) not in self.app_context.metadata_cache:
+            prepare_metadata(self)
 
     @property
     def requires_python(self):
         return self.metadata.get("Requires-Python")
 
-    def _get_dependencies(self):
+    def _get_dependencies(self, evaluator):
         deps = self.metadata.get_all("Requires-Dist", [])
         extras = self.extras if self.extras else [""]
         for d in deps:
-            r = Requirement(d.replace("\n", " "))
+            r = parse_requirement(d)
             if r.marker is None:
                 yield r
-            else:
-                for e in extras:
-                    if r.marker.evaluate({"extra": e}):
-                        yield r
+            elif any(evaluator.evaluate(r.marker, e) for e in extras):
+                yield r
 
     @property
     def dependencies(self):
-        if self._dependencies is None:
-            self._dependencies = list(self._get_dependencies())
-        return self._dependencies
+        return self.dependencies_for(None)
+
+    def dependencies_for(self, environment):
+        """Return dependencies with markers evaluated in the given environment.
+
+        Defaults to the environment of the app context.
+        """
+        if environment is None:
+            environment = self.app_context.environment
+        evaluator = environment.marker_evaluator
+        dependencies = self._dependencies.get(evaluator)
+        if dependencies is None:
+            dependencies = list(self._get_dependencies(evaluator))
+            self._dependencies[evaluator] = dependencies
+        return dependencies
@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from zipfile import BadZipFile
+
+from packaging.utils import InvalidSdistFilename, InvalidWheelFilename
+from packaging.version import InvalidVersion
+
+from .cache import decode_metadata, encode_metadata
+from .candidate import Candidate
+from .distribution import Distribution, UnsupportedFileType
+from .metadata import MetadataNotFound, metadata_from_sdist, metadata_from_wheel
+
+log = logging.getLogger(__name__)
+
+CATALOG_NAME = ".untangled_snakes.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    requires_python TEXT,
+    metadata BLOB
+);
+CREATE INDEX IF NOT EXISTS files_name ON files (name);
+"""
+
+
+class Catalog:
+    """SQLite catalog of the distribution files in a directory.
+
+    For each file, its project name, sha256, Requires-Python and compressed
+    metadata headers are stored, so that resolving doesn't need to hash or
+    open any of them. The database is memory-mapped for reading.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA mmap_size = 268435456")
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def update(self, directory, max_workers=None):
+        """Scan files added or changed since the last update, forget removed ones.
+
+        Returns the numbers of scanned and removed files.
+        """
+        directory = Path(directory)
+        stats = dict()
+        for root, dirs, files in os.walk(directory):
+            for filename in files:
+                if not filename.endswith((".whl", ".tar.gz")):
+                    continue
+                stat = os.stat(os.path.join(root, filename))
+                path = Path(root, filename).relative_to(directory).as_posix()
+                stats[path] = (stat.st_size, stat.st_mtime_ns)
+
+        with self.lock:
+            known = {
+                path: (size, mtime_ns)
+                for path, size, mtime_ns in self.connection.execute(
+                    "SELECT path, size, mtime_ns FROM files"
+                )
+            }
+        changed = [path for path, stat in stats.items() if known.get(path) != stat]
+        removed = [(path,) for path in known.keys() - stats.keys()]
+
+        with ThreadPoolExecutor(max_workers) as pool:
+            rows = pool.map(lambda path: scan_file(directory, path), changed)
+            rows = [row + stats[row[0]] for row in rows if row is not None]
+
+        with self.lock, self.connection:
+            self.connection.executemany("DELETE FROM files WHERE path = ?", removed)
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO files "
+                "(path, name, sha256, requires_python, metadata, size, mtime_ns) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(changed), len(removed)
+
+    def files(self, name):
+        """Return path, sha256 and Requires-Python of the files of a project."""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT path, sha256, requires_python FROM files "
+                "WHERE name = ? ORDER BY path",
+                (name,),
+            ).fetchall()
+
+    def metadata(self, path):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT metadata FROM files WHERE path = ?", (path,)
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return decode_metadata(row[0])
+
+    def close(self):
+        self.connection.close()
+
+
+def scan_file(directory, path):
+    """Return path, name, sha256, Requires-Python and metadata of a file."""
+    try:
+        distribution = Distribution(PurePosixPath(path).name)
+    except (
+        UnsupportedFileType,
+        InvalidVersion,
+        InvalidSdistFilename,
+        InvalidWheelFilename,
+    ) as e:
+        log.info(f"skipping {path} because of {e}")
+        return None
+
+    digest = hashlib.sha256()
+    with open(directory / path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+        f.seek(0)
+        candidate = Candidate(None, distribution)
+        try:
+            if distribution.is_wheel:
+                metadata = metadata_from_wheel(candidate, f)
+            else:
+                metadata = metadata_from_sdist(candidate, f)
+        except (BadZipFile, tarfile.TarError, OSError) as e:
+            log.warning(f"can't read metadata of {path}: {e}")
+            metadata = None
+
+    if metadata is None:
+        return (path, distribution.name, digest.hexdigest(), None, None)
+    return (
+        path,
+        distribution.name,
+        digest.hexdigest(),
+        metadata.get("Requires-Python"),
+        encode_metadata(metadata),
+    )
+
+
+class LocalCandidate(Candidate):
+    """A candidate for a file in a catalog, which also provides its metadata."""
+
+    __slots__ = ("catalog", "path")
+
+    def __init__(self, catalog, path, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.catalog = catalog
+        self.path = path
+
+    def _fetch_metadata(self):
+        metadata = self.catalog.metadata(self.path)
+        if metadata is None:
+            raise MetadataNotFound(f"No metadata found for {self} ({self.url})")
+        return metadata
+
+    def prepare_metadata(self):
+        pass
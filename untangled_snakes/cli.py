@@ -0,0 +1,716 @@
+import argparse
+import logging
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import resolvelib
+from packaging.requirements import Requirement
+from packaging.utils import canonicalize_name
+
+from .providers import PyPiProvider
+from .finders import LegacyMetadataFinder, make_finder
+from .app_context import AppContext
+from .cache import default_cache_dir
+from .test_cases import start_test_case, finish_test_case
+from .reporters import REPORTERS, ProfilingReporter, make_reporter
+from .transport import TRANSPORTS
+from .catalog import CATALOG_NAME
+from .batch import read_manifest
+from .locks import locked_candidates, read_lock
+from .environments import PLATFORMS, Environment, load_environment, split_platform
+from .lru import LRUCache
+from .server import BadRequest, ResolutionFailed, make_server
+from .client import client_main
+
+# options shared by all commands
+common_parser = argparse.ArgumentParser(add_help=False)
+common_parser.add_argument(
+    "--legacy-metadata",
+    action="append",
+    default=[],
+    help="List of non-standard-compliant packages for which we should evaluate "
+    "setup.py. This happens automatically for packages which don't include "
+    "compliant metadata at all, but you need to force it if a packages "
+    "metadata misses requirements.",
+)
+common_parser.add_argument(
+    "--index-url",
+    default="https://pypi.org/simple",
+    help="A PEP 691 simple index, or a directory or file:// URL with "
+    "wheels and sdists to resolve from without any network access.",
+)
+common_parser.add_argument(
+    "--catalog",
+    type=Path,
+    help="Where to keep the catalog of a local --index-url. Defaults to a "
+    f"{CATALOG_NAME} file in the directory itself, or if it is read-only, "
+    "to the --cache-dir or memory.",
+)
+common_parser.add_argument(
+    "--snapshot",
+    type=Path,
+    help="Resolve without any network access from a snapshot written by the "
+    "snapshot command, instead of --index-url.",
+)
+common_parser.add_argument(
+    "--prefetch-workers",
+    type=int,
+    default=8,
+    help="Number of index pages to fetch concurrently in the background, "
+    "as soon as a candidate's dependencies are known. 0 disables prefetching.",
+)
+common_parser.add_argument(
+    "--cache-dir",
+    type=Path,
+    default=default_cache_dir(),
+    help="Directory to persist index pages and metadata in between runs.",
+)
+common_parser.add_argument(
+    "--no-cache",
+    action="store_const",
+    const=None,
+    dest="cache_dir",
+    help="Don't persist anything in between runs.",
+)
+common_parser.add_argument(
+    "--index-max-age",
+    type=int,
+    help="Use cached index pages younger than this many seconds without "
+    "revalidating them with the index.",
+)
+common_parser.add_argument(
+    "--build-workers",
+    type=int,
+    help="Number of processes to prepare metadata from sdists in. "
+    "Defaults to the number of CPUs.",
+)
+common_parser.add_argument(
+    "--transport",
+    choices=sorted(TRANSPORTS),
+    default="requests",
+    help="HTTP client to use. httpx uses HTTP/2 if h2 is installed, "
+    "httpx-async runs all requests on an event loop in a single thread.",
+)
+common_parser.add_argument(
+    "--pool-size",
+    type=int,
+    help="Number of connections to keep alive for reuse. Defaults to twice "
+    "the number of prefetch workers, but at least 16.",
+)
+common_parser.add_argument(
+    "--retries",
+    type=int,
+    default=3,
+    help="Number of times to retry requests failing with connection errors, "
+    "timeouts or server errors, with exponential backoff.",
+)
+common_parser.add_argument(
+    "--timeout",
+    type=float,
+    default=30.0,
+    help="Seconds to wait for a connection or response data.",
+)
+common_parser.add_argument(
+    "--max-projects",
+    type=int,
+    metavar="N",
+    help="Keep at most this many projects' candidates in memory, evicting "
+    "the least recently used ones. Unlimited by default.",
+)
+common_parser.add_argument(
+    "--max-metadata-mb",
+    type=float,
+    metavar="MB",
+    help="Keep at most about this much metadata in memory, evicting the "
+    "least recently used. Unlimited by default. Evicted projects and "
+    "metadata are read from the cache again if needed.",
+)
+common_parser.add_argument(
+    "--target",
+    action="append",
+    default=[],
+    metavar="PLATFORM",
+    help="Lock for this platform instead of the host, can be given more than "
+    f"once. Either one of {', '.join(PLATFORMS)} or a JSON file with name, "
+    "python_version, tags and markers of an environment. Darwin platforms "
+    "only accept wheels built for macOS 11.0 or older, unless followed by "
+    "the oldest macOS version to support, like aarch64-darwin@14.0.",
+)
+common_parser.add_argument(
+    "--python-version",
+    help="Python version to lock for, of the host and of platform targets. "
+    "Defaults to the version running untangled_snakes.",
+)
+common_parser.add_argument(
+    "--reporter",
+    choices=sorted(REPORTERS),
+    default="summary",
+    help="silent: report nothing. summary: log counters once resolution ends. "
+    "json: write resolver events to stderr as JSON lines. "
+    "debug: log every event and render the resolver state as a table.",
+)
+common_parser.add_argument(
+    "--debug-every",
+    type=int,
+    metavar="N",
+    help="With --reporter debug, render the state table every N rounds, "
+    "not only at the end.",
+)
+common_parser.add_argument(
+    "--profile",
+    nargs="?",
+    const=True,
+    metavar="PATH",
+    help="Write counters, transferred bytes, cache hit rates and latencies "
+    "as JSON to PATH. Defaults to the lock path with a .profile.json suffix, "
+    "or untangled_snakes.profile.json if the lock is printed.",
+)
+
+arg_parser = argparse.ArgumentParser(parents=[common_parser])
+arg_parser.add_argument("-r", "--requirements-list", action="append", default=[])
+arg_parser.add_argument("--record-test-case")
+arg_parser.add_argument(
+    "--from-lock",
+    type=Path,
+    metavar="LOCK",
+    help="Prefer the versions pinned in an existing lock and reuse their "
+    "URLs and hashes, only consulting the index for requirements they "
+    "don't satisfy.",
+)
+arg_parser.add_argument(
+    "-o",
+    "--output",
+    type=Path,
+    help="Write the lock to this file instead of stdout.",
+)
+arg_parser.add_argument(
+    "--server",
+    metavar="ADDRESS",
+    help="Forward the requirements, --legacy-metadata, --target, "
+    "--python-version and --from-lock to a server started with the serve "
+    "command instead of resolving them here. Other options are the server's.",
+)
+
+batch_parser = argparse.ArgumentParser(
+    prog="untangled_snakes batch",
+    parents=[common_parser],
+    description="Lock many sets of requirements, sharing index pages and "
+    "metadata between them.",
+)
+batch_parser.add_argument(
+    "manifest",
+    type=Path,
+    help="A JSON lines file with one object per lock, or a directory with "
+    "one requirements .txt file per lock.",
+)
+batch_parser.add_argument(
+    "-o",
+    "--output-dir",
+    type=Path,
+    default=Path("."),
+    help="Directory to write the locks to.",
+)
+batch_parser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    default=1,
+    help="Number of resolutions to run concurrently.",
+)
+
+snapshot_parser = argparse.ArgumentParser(
+    prog="untangled_snakes snapshot",
+    parents=[common_parser],
+    description="Resolve requirements and capture the index pages and "
+    "metadata the resolution used into a single SQLite file, to resolve "
+    "them again later with --snapshot.",
+)
+snapshot_parser.add_argument("-r", "--requirements-list", action="append", default=[])
+snapshot_parser.add_argument(
+    "path",
+    type=Path,
+    help="The snapshot to write. An existing snapshot is added to.",
+)
+
+serve_parser = argparse.ArgumentParser(
+    prog="untangled_snakes serve",
+    parents=[common_parser],
+    description="Resolve requests of clients, started with --server, keeping "
+    "index pages and metadata in memory between them.",
+)
+serve_parser.add_argument(
+    "address",
+    help="A Unix socket to listen on, or http://127.0.0.1:PORT to listen on "
+    "localhost. There's no authentication, anyone who can connect can resolve.",
+)
+
+logging.basicConfig(level=logging.INFO)
+
+
+def generate_lock(result):
+    """Return the lock of a single resolution, as the "default" target."""
+    return generate_targets_lock({"default": result})
+
+
+def generate_targets_lock(results):
+    """Return a lock with a target for each resolution in results, by name.
+
+    Targets share their sources. Should a target have resolved a project to
+    another file than the first target, its source is listed in
+    "target_sources" instead.
+    """
+    sources = dict()
+    target_sources = dict()
+    targets = dict()
+    for name, result in results.items():
+        targets[name] = dependency_graph(result)
+        for identifier, candidate in result.mapping.items():
+            source = {
+                "url": candidate.url,
+                "sha256": candidate.sha256,
+                "version": str(candidate.version),
+            }
+            # lets re-locking check it without the index or the metadata
+            if candidate.index_requires_python:
+                source["requires_python"] = candidate.index_requires_python
+            if sources.setdefault(identifier.name, source) != source:
+                target_sources.setdefault(name, dict())[identifier.name] = source
+
+    lock = {"sources": sources, "targets": targets}
+    if target_sources:
+        lock["target_sources"] = target_sources
+    return lock
+
+
+def dependency_graph(result):
+    target = dict()
+    for package, dependency in result.graph.iter_edges():
+        if dependency.name not in target:
+            target[dependency.name] = []
+        if package is None:
+            # this edge is from None to a root package
+            continue
+        if package.name not in target:
+            target[package.name] = list()
+        target[package.name].append(dependency.name)
+    return {k: sorted(v) for k, v in target.items()}
+
+
+def resolve(
+    app_context,
+    requirements,
+    reporter=None,
+    finder=None,
+    locked=None,
+    environment=None,
+):
+    """Resolve requirements, closing the finder afterwards unless one is given.
+
+    Candidates in locked, as returned by `locked_candidates`, are preferred
+    over anything on the index. Resolves for the environment of the app
+    context unless another one is given.
+    """
+    owns_finder = finder is None
+    if owns_finder:
+        finder = make_finder(app_context)
+    locked = locked or dict()
+    provider = PyPiProvider(finder, locked, environment)
+    if reporter is None:
+        reporter = make_reporter("summary")
+    reporter = ProfilingReporter(reporter, app_context.profile)
+    resolver = resolvelib.Resolver(provider, reporter)
+    names = {canonicalize_name(r.name) for r in requirements}
+    finder.prefetch(name for name in names if name not in locked)
+    try:
+        result = resolver.resolve(requirements, max_rounds=500)
+        for candidate in result.mapping.values():
+            candidate.keep_locked_metadata()
+        return result
+    finally:
+        if owns_finder:
+            finder.close()
+
+
+def resolve_targets(
+    app_context,
+    requirements,
+    environments=None,
+    reporter_factory=None,
+    finder=None,
+    locked=None,
+):
+    """Resolve requirements for each environment, returning results by name.
+
+    The resolutions run concurrently and share a finder, so index pages and
+    metadata are only fetched once. Without environments, the one of the
+    app context is used. Each resolution gets its own reporter from
+    reporter_factory.
+    """
+    if not environments:
+        environments = [app_context.environment]
+    names = [environment.name for environment in environments]
+    if len(set(names)) != len(names):
+        raise ValueError(f"target names must be unique: {names}")
+    owns_finder = finder is None
+    if owns_finder:
+        finder = make_finder(app_context)
+
+    def run(environment):
+        reporter = reporter_factory() if reporter_factory else None
+        return resolve(app_context, requirements, reporter, finder, locked, environment)
+
+    try:
+        if len(environments) == 1:
+            return {names[0]: run(environments[0])}
+        with ThreadPoolExecutor(len(environments), thread_name_prefix="target") as pool:
+            return dict(zip(names, pool.map(run, environments)))
+    finally:
+        if owns_finder:
+            finder.close()
+
+
+def resolve_batch(
+    app_context, jobs, reporter_factory=None, workers=1, environments=None
+):
+    """Resolve jobs with one shared finder and write a lock for each of them.
+
+    Each job is resolved for all environments, as in `resolve_targets`.
+    Returns the jobs which failed to resolve.
+    """
+    finder = make_finder(app_context)
+
+    def run(job):
+        results = resolve_targets(
+            app_context, job.requirements, environments, reporter_factory, finder
+        )
+        job.write_lock(generate_targets_lock(results))
+
+    failed = []
+    try:
+        with ThreadPoolExecutor(max(workers, 1), thread_name_prefix="batch") as pool:
+            futures = {pool.submit(run, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"failed to lock {job.name}: {e!r}")
+                    failed.append(job)
+                else:
+                    logging.info(f"locked {job.name} to {job.output}")
+    finally:
+        finder.close()
+    return failed
+
+
+def batch_main(argv):
+    args = batch_parser.parse_args(argv)
+    jobs = read_manifest(args.manifest, args.output_dir)
+    app_context = AppContext(
+        legacy_metadata=args.legacy_metadata,
+        prefetch_workers=args.prefetch_workers,
+        cache_dir=args.cache_dir,
+        index_max_age=args.index_max_age,
+        build_workers=args.build_workers,
+        transport=args.transport,
+        pool_size=args.pool_size,
+        retries=args.retries,
+        timeout=args.timeout,
+        index_url=args.index_url,
+        catalog_path=args.catalog,
+        snapshot=args.snapshot,
+        python_version=args.python_version,
+        max_projects=args.max_projects,
+        max_metadata_bytes=metadata_bytes(args.max_metadata_mb),
+    )
+    try:
+        failed = resolve_batch(
+            app_context,
+            jobs,
+            lambda: make_reporter(args.reporter, args.debug_every),
+            args.jobs,
+            [load_environment(target, args.python_version) for target in args.target],
+        )
+    finally:
+        app_context.close()
+
+    if args.profile:
+        write_profile(app_context, profile_path(args.profile, None))
+    if failed:
+        sys.exit(f"failed to lock {len(failed)} of {len(jobs)} requirement sets")
+
+
+def snapshot_main(argv):
+    args = snapshot_parser.parse_args(argv)
+    app_context = AppContext(
+        legacy_metadata=args.legacy_metadata,
+        prefetch_workers=args.prefetch_workers,
+        cache_dir=args.cache_dir,
+        index_max_age=args.index_max_age,
+        build_workers=args.build_workers,
+        transport=args.transport,
+        pool_size=args.pool_size,
+        retries=args.retries,
+        timeout=args.timeout,
+        index_url=args.index_url,
+        catalog_path=args.catalog,
+        record_snapshot=args.path,
+        python_version=args.python_version,
+        max_projects=args.max_projects,
+        max_metadata_bytes=metadata_bytes(args.max_metadata_mb),
+    )
+    requirements = [Requirement(r) for r in args.requirements_list]
+    try:
+        resolve_targets(
+            app_context,
+            requirements,
+            [load_environment(target, args.python_version) for target in args.target],
+            lambda: make_reporter(args.reporter, args.debug_every),
+        )
+        counts = app_context.record_snapshot.counts()
+    finally:
+        app_context.close()
+    logging.info(
+        f"Wrote {counts['projects']} projects with {counts['files']} files "
+        f"and {counts['metadata']} metadata records to {args.path}."
+    )
+    if args.profile:
+        write_profile(app_context, profile_path(args.profile, None))
+
+
+class ResolverService:
+    """Resolve requests of the serve command, keeping finders warm.
+
+    A request is a JSON object with "requirements", and optionally
+    "legacy_metadata", "targets", "python_version" and a "lock" to re-lock
+    from. All requests share an app context created with options, and its
+    finder. As legacy metadata changes which metadata is used, requests with
+    legacy metadata get a LegacyMetadataFinder on it, of which the
+    `max_legacy_finders` most recently used are kept. Targets are names of
+    PLATFORMS or environments as JSON objects, the `max_environments` most
+    recently used environments are kept per target and Python version, so
+    that the finder's views on them are reused.
+    """
+
+    def __init__(
+        self,
+        reporter_factory=None,
+        max_legacy_finders=16,
+        max_environments=16,
+        **options,
+    ):
+        self.reporter_factory = reporter_factory
+        self.app_context = AppContext(**options)
+        self.finder = make_finder(self.app_context)
+        # LegacyMetadataFinder by sorted legacy metadata packages
+        self.legacy_finders = LRUCache(
+            "server.legacy_finders",
+            max_legacy_finders,
+            profile=self.app_context.profile,
+        )
+        # environments by target and Python version
+        self.environments = LRUCache(
+            "server.environments",
+            max_environments,
+            profile=self.app_context.profile,
+        )
+
+    def _context(self, legacy_metadata):
+        key = tuple(sorted(set(legacy_metadata)))
+        if not key:
+            return self.app_context, self.finder
+        finder = self.legacy_finders.get(key)
+        if finder is None:
+            app_context = self.app_context.with_legacy_metadata(list(key))
+            finder = LegacyMetadataFinder(self.finder, app_context)
+            finder = self.legacy_finders.setdefault(key, finder)
+        return finder.app_context, finder
+
+    def _environments(self, app_context, targets, python_version):
+        if not targets and python_version is None:
+            return [app_context.environment]
+        environments = []
+        for target in targets or [None]:
+            # environments are given inline, the server's files aren't for
+            # clients to open
+            if isinstance(target, dict):
+                key = (json.dumps(target, sort_keys=True), python_version)
+            elif target is None or split_platform(target)[0] is not None:
+                key = (target, python_version)
+            else:
+                raise BadRequest(f"unknown target {target!r}")
+            environment = self.environments.get(key)
+            if environment is None:
+                if target is None:
+                    environment = Environment.host(python_version)
+                elif isinstance(target, dict):
+                    environment = Environment.from_dict(target)
+                else:
+                    environment = load_environment(target, python_version)
+                environment = self.environments.setdefault(key, environment)
+            environments.append(environment)
+        return environments
+
+    def resolve(self, request):
+        """Return the lock for a request, as generate_targets_lock does."""
+        try:
+            app_context, finder = self._context(request.get("legacy_metadata", []))
+            requirements = [Requirement(r) for r in request["requirements"]]
+            environments = self._environments(
+                app_context, request.get("targets", []), request.get("python_version")
+            )
+            locked = None
+            if request.get("lock"):
+                locked = locked_candidates(app_context, request["lock"])
+        except (KeyError, TypeError, ValueError, OSError) as e:
+            raise BadRequest(repr(e)) from e
+        try:
+            results = resolve_targets(
+                app_context,
+                requirements,
+                environments,
+                self.reporter_factory,
+                finder,
+                locked,
+            )
+        except resolvelib.ResolutionError as e:
+            raise ResolutionFailed(repr(e)) from e
+        return generate_targets_lock(results)
+
+    def stats(self):
+        """Return the profile shared by all requests."""
+        return self.app_context.profile.report()
+
+    def close(self):
+        self.finder.close()
+        self.app_context.close()
+
+
+def serve_main(argv):
+    args = serve_parser.parse_args(argv)
+    if args.legacy_metadata or args.target:
+        serve_parser.error(
+            "--legacy-metadata and --target are given by clients, per request"
+        )
+    service = ResolverService(
+        lambda: make_reporter(args.reporter, args.debug_every),
+        prefetch_workers=args.prefetch_workers,
+        cache_dir=args.cache_dir,
+        index_max_age=args.index_max_age,
+        build_workers=args.build_workers,
+        transport=args.transport,
+        pool_size=args.pool_size,
+        retries=args.retries,
+        timeout=args.timeout,
+        index_url=args.index_url,
+        catalog_path=args.catalog,
+        snapshot=args.snapshot,
+        python_version=args.python_version,
+        max_projects=args.max_projects,
+        max_metadata_bytes=metadata_bytes(args.max_metadata_mb),
+    )
+    server = make_server(args.address, service)
+    logging.info(f"Serving on {args.address}.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if not args.address.startswith("http://"):
+            Path(args.address).unlink(missing_ok=True)
+        service.close()
+        if args.profile:
+            write_profile(service.app_context, profile_path(args.profile, None))
+
+
+COMMANDS = {
+    "batch": batch_main,
+    "snapshot": snapshot_main,
+    "serve": serve_main,
+}
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+
+    args = arg_parser.parse_args(argv)
+    if args.server:
+        return client_main(argv)
+
+    app_context = AppContext(
+        args.record_test_case,
+        args.legacy_metadata,
+        args.prefetch_workers,
+        args.cache_dir,
+        args.index_max_age,
+        args.build_workers,
+        args.transport,
+        args.pool_size,
+        args.retries,
+        args.timeout,
+        args.index_url,
+        args.catalog,
+        args.snapshot,
+        python_version=args.python_version,
+        max_projects=args.max_projects,
+        max_metadata_bytes=metadata_bytes(args.max_metadata_mb),
+    )
+    requirements = [Requirement(r) for r in args.requirements_list]
+
+    if app_context.record_test_case:
+        start_test_case(app_context, requirements)
+
+    locked = None
+    if args.from_lock:
+        locked = locked_candidates(app_context, read_lock(args.from_lock))
+
+    try:
+        results = resolve_targets(
+            app_context,
+            requirements,
+            [load_environment(target, args.python_version) for target in args.target],
+            lambda: make_reporter(args.reporter, args.debug_every),
+            locked=locked,
+        )
+    finally:
+        app_context.close()
+    lock = generate_targets_lock(results)
+
+    if app_context.record_test_case:
+        finish_test_case(app_context, lock)
+    elif args.output:
+        with open(args.output, "w") as f:
+            json.dump(lock, f, indent=2)
+    else:
+        print(json.dumps(lock, indent=2))
+
+    if args.profile:
+        write_profile(app_context, profile_path(args.profile, args.output))
+
+
+def metadata_bytes(megabytes):
+    return int(megabytes * 1024 * 1024) if megabytes else None
+
+
+def profile_path(profile, output):
+    if profile is not True:
+        return Path(profile)
+    if output:
+        return output.with_name(f"{output.stem}.profile.json")
+    return Path("untangled_snakes.profile.json")
+
+
+def write_profile(app_context, path):
+    with open(path, "w") as f:
+        json.dump(app_context.profile.report(), f, indent=2)
+    logging.info(f"Wrote profile to {path}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Forward resolutions to a server started with the serve command.
+
+Only the standard library and the server module are imported, so that
+clients start quickly. Options are documented by the main command's parser.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from .server import ServerError, request
+
+# the options forwarded to the server, all others are the server's
+client_parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+client_parser.add_argument("--server")
+client_parser.add_argument("-r", "--requirements-list", action="append", default=[])
+client_parser.add_argument("--legacy-metadata", action="append", default=[])
+client_parser.add_argument("--target", action="append", default=[])
+client_parser.add_argument("--python-version")
+client_parser.add_argument("--from-lock")
+client_parser.add_argument("-o", "--output")
+
+
+def server_address(argv):
+    """Return the --server of a command line of main, or None."""
+    if not argv or not argv[0].startswith("-"):
+        # commands, like serve, don't forward to servers
+        return None
+    args, _ = client_parser.parse_known_args(argv)
+    return args.server
+
+
+def read_target(target):
+    """Return the environment of a JSON file for the server, which only opens
+    files of its own."""
+    if not os.path.isfile(target):
+        return target
+    with open(target) as f:
+        return json.load(f)
+
+
+def client_main(argv):
+    """Resolve through a server, for main with --server."""
+    args, _ = client_parser.parse_known_args(argv)
+    payload = {
+        "requirements": args.requirements_list,
+        "legacy_metadata": args.legacy_metadata,
+        "targets": [read_target(target) for target in args.target],
+        "python_version": args.python_version,
+    }
+    if args.from_lock:
+        with open(args.from_lock) as f:
+            payload["lock"] = json.load(f)
+    try:
+        lock = request(args.server, "POST", "/resolve", payload)
+    except (ServerError, OSError) as e:
+        sys.exit(f"failed to resolve with {args.server}: {e}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(lock, f, indent=2)
+    else:
+        print(json.dumps(lock, indent=2))
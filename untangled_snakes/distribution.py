@@ -1,20 +1,33 @@
 import re
 
+from packaging.tags import parse_tag
 from packaging.utils import (
-    parse_wheel_filename,
+    InvalidWheelFilename,
     InvalidSdistFilename,
     canonicalize_name,
 )
-from packaging.version import Version
+from packaging.version import Version, InvalidVersion
 
 PACKAGE_VERSION_RE = re.compile(r"(?P<name>.*)-(?P<version>\d+\..*)")
+WHEEL_NAME_RE = re.compile(r"^[\w._]+\Z", re.UNICODE)
+BUILD_TAG_RE = re.compile(r"(\d+)(.*)", re.ASCII)
+
+
+def parse_version(version, versions=None):
+    """Parse version, reusing instances from the versions dict if given."""
+    if versions is None:
+        return Version(version)
+    parsed = versions.get(version)
+    if parsed is None:
+        parsed = versions[version] = Version(version)
+    return parsed
 
 
 # FIXME: We temporarily implement this ourselves, because upstreams
 # version is too naive atm, see https://github.com/pypa/packaging/issues/703
 # As long as name and version are separated by "-" and the name does not
 # include a ".", the regex above should work
-def parse_sdist_filename(filename):
+def parse_sdist_filename(filename, versions=None):
     if not filename.endswith(".tar.gz"):
         raise InvalidSdistFilename(
             f"Invalid sdist filename (extension must be '.tar.gz' or '.zip'):"
@@ -25,10 +38,44 @@ def parse_sdist_filename(filename):
     if not match:
         raise InvalidSdistFilename(f"Invalid sdist filename: {filename}")
     name = canonicalize_name(match.group("name"))
-    version = Version(match.group("version"))
+    version = parse_version(match.group("version"), versions)
     return name, version
 
 
+# Like packaging.utils.parse_wheel_filename, but returns the tags unparsed,
+# as parsing them into a frozenset of Tags is costly and rarely needed.
+def parse_wheel_filename(filename, versions=None):
+    if not filename.endswith(".whl"):
+        raise InvalidWheelFilename(
+            f"Invalid wheel filename (extension must be '.whl'): {filename}"
+        )
+    filename = filename[:-4]
+    dashes = filename.count("-")
+    if dashes not in (4, 5):
+        raise InvalidWheelFilename(
+            f"Invalid wheel filename (wrong number of parts): {filename}"
+        )
+    parts = filename.split("-", dashes - 2)
+    name_part = parts[0]
+    if "__" in name_part or WHEEL_NAME_RE.match(name_part) is None:
+        raise InvalidWheelFilename(f"Invalid project name: {filename}")
+    name = canonicalize_name(name_part)
+    try:
+        version = parse_version(parts[1], versions)
+    except InvalidVersion as e:
+        raise InvalidWheelFilename(
+            f"Invalid wheel filename (invalid version): {filename}"
+        ) from e
+    if dashes == 5:
+        match = BUILD_TAG_RE.match(parts[2])
+        if match is None:
+            raise InvalidWheelFilename(f"Invalid build number: {parts[2]}")
+        build = (int(match.group(1)), match.group(2))
+    else:
+        build = ()
+    return name, version, build, parts[-1]
+
+
 class InvalidDistribution(Exception):
     pass
 
@@ -40,18 +87,33 @@ class UnsupportedFileType(InvalidDistribution):
 
 
 class Distribution:
-    def __init__(self, filename):
+    __slots__ = ("filename", "name", "version", "build", "_tag_string", "_tags")
+
+    def __init__(self, filename, versions=None):
+        """Parse filename, versions is an optional dict to intern versions in."""
         self.filename = filename
+        self._tags = None
 
         if self.is_wheel:
-            self.name, self.version, self.build, self.tags = parse_wheel_filename(
-                filename
-            )
+            (
+                self.name,
+                self.version,
+                self.build,
+                self._tag_string,
+            ) = parse_wheel_filename(filename, versions)
         elif self.is_sdist:
-            self.name, self.version = parse_sdist_filename(filename)
+            self.name, self.version = parse_sdist_filename(filename, versions)
+            self.build = ()
+            self._tag_string = None
         else:
             raise UnsupportedFileType(self.filename)
 
+    @property
+    def tags(self):
+        if self._tags is None and self._tag_string is not None:
+            self._tags = parse_tag(self._tag_string)
+        return self._tags
+
     @property
     def is_wheel(self):
         return self.filename.endswith(".whl")
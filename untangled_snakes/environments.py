@@ -0,0 +1,167 @@
+import json
+import platform
+
+from packaging.tags import compatible_tags, cpython_tags, mac_platforms, parse_tag
+from packaging.version import Version
+
+from .markers import MarkerEvaluator
+from .specifiers import contains, parse_specifier
+
+# newest glibc version of linux targets
+MANYLINUX_MAX_GLIBC = 39
+
+
+def manylinux_platforms(arch, min_glibc=17):
+    platforms = [
+        f"manylinux_2_{minor}_{arch}"
+        for minor in range(MANYLINUX_MAX_GLIBC, min_glibc - 1, -1)
+    ]
+    # legacy aliases of manylinux_2_17, _2_12 and _2_5
+    legacy = {17: "manylinux2014", 12: "manylinux2010", 5: "manylinux1"}
+    platforms += [f"{legacy[minor]}_{arch}" for minor in legacy if minor >= min_glibc]
+    return platforms
+
+
+# oldest macOS version of darwin targets, unless given after an @, like
+# aarch64-darwin@14.0, which also accepts wheels built for macOS 12 to 14
+MACOS_DEPLOYMENT_TARGET = (11, 0)
+
+# platform tags and marker values of targets we know how to lock for
+PLATFORMS = {
+    "x86_64-linux": (
+        manylinux_platforms("x86_64", min_glibc=5),
+        {"sys_platform": "linux", "platform_system": "Linux"},
+        "x86_64",
+    ),
+    "aarch64-linux": (
+        manylinux_platforms("aarch64"),
+        {"sys_platform": "linux", "platform_system": "Linux"},
+        "aarch64",
+    ),
+    "x86_64-darwin": (
+        list(mac_platforms(MACOS_DEPLOYMENT_TARGET, "x86_64")),
+        {"sys_platform": "darwin", "platform_system": "Darwin"},
+        "x86_64",
+    ),
+    "aarch64-darwin": (
+        list(mac_platforms(MACOS_DEPLOYMENT_TARGET, "arm64")),
+        {"sys_platform": "darwin", "platform_system": "Darwin"},
+        "arm64",
+    ),
+}
+
+
+class Environment:
+    """A target to lock for: a Python version, wheel tags and marker values.
+
+    Without tags, wheels aren't filtered by platform at all, which is what
+    the default environment of the host does.
+    """
+
+    def __init__(self, name, python_version, tags=None, markers=None):
+        self.name = name
+        self.python_version = Version(python_version)
+        self.tags = frozenset(tags) if tags is not None else None
+        self.marker_evaluator = MarkerEvaluator(
+            {**self._python_markers(), **(markers or {})}
+        )
+
+    def __repr__(self):
+        return f"<Environment {self.name} (Python {self.python_version})>"
+
+    def _python_markers(self):
+        release = self.python_version.release
+        full_version = ".".join(str(n) for n in (release + (0, 0))[:3])
+        return {
+            "python_version": ".".join(str(n) for n in (release + (0,))[:2]),
+            "python_full_version": full_version,
+            "implementation_version": full_version,
+        }
+
+    @classmethod
+    def host(cls, python_version=None):
+        """Return the environment of the host, optionally another Python version."""
+        return cls("default", python_version or platform.python_version())
+
+    @classmethod
+    def from_platform(cls, name, python_version):
+        """Return the environment of a CPython on one of PLATFORMS.
+
+        Darwin platforms may be followed by a macOS deployment target, like
+        aarch64-darwin@14.0.
+        """
+        platform_name, macos_version = split_platform(name)
+        platforms, markers, machine = PLATFORMS[platform_name]
+        if macos_version is not None:
+            platforms = list(mac_platforms(macos_version, machine))
+        version = Version(python_version).release[:2]
+        interpreter = f"cp{version[0]}{version[1]}"
+        tags = list(cpython_tags(version, platforms=platforms))
+        tags += compatible_tags(version, interpreter, platforms)
+        markers = {
+            **markers,
+            "platform_machine": machine,
+            "os_name": "posix",
+            "implementation_name": "cpython",
+            "platform_python_implementation": "CPython",
+            "platform_release": "",
+            "platform_version": "",
+        }
+        return cls(name, python_version, tags, markers)
+
+    @classmethod
+    def from_file(cls, path):
+        """Load an environment from a JSON file like
+
+        {"name": "...", "python_version": "3.11", "tags": ["cp311-cp311-..."],
+         "markers": {"sys_platform": "linux", ...}}
+        """
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def from_dict(cls, data):
+        """Load an environment from a dict, as from_file reads it."""
+        tags = None
+        if "tags" in data:
+            tags = [tag for string in data["tags"] for tag in parse_tag(string)]
+        return cls(data["name"], data["python_version"], tags, data.get("markers"))
+
+    def supports_python(self, requires_python):
+        if not requires_python:
+            return True
+        return contains(parse_specifier(requires_python), self.python_version)
+
+    def supports(self, candidate):
+        """Whether the file of candidate can be installed in this environment."""
+        if not self.supports_python(candidate.index_requires_python):
+            return False
+        if self.tags is None or not candidate.is_wheel:
+            return True
+        return not self.tags.isdisjoint(candidate.distribution.tags)
+
+
+def split_platform(target):
+    """Return the name in PLATFORMS and the macOS version of a target.
+
+    The version is None unless given, and raises ValueError if invalid or
+    given for another platform than darwin. Targets which aren't platforms
+    are returned as (None, None).
+    """
+    name, _, version = target.partition("@")
+    if name not in PLATFORMS:
+        return None, None
+    if not version:
+        return name, None
+    if not name.endswith("-darwin"):
+        raise ValueError(f"only darwin targets have a macOS version: {target}")
+    return name, (Version(version).release + (0,))[:2]
+
+
+def load_environment(target, python_version=None):
+    """Return the environment of a platform in PLATFORMS, or from a JSON file."""
+    if split_platform(target)[0] is not None:
+        if python_version is None:
+            python_version = platform.python_version()
+        return Environment.from_platform(target, python_version)
+    return Environment.from_file(target)
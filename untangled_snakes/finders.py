@@ -1,54 +1,189 @@
+import hashlib
 import logging
-from platform import python_version
+import sqlite3
+import threading
+import time
+from pathlib import Path, PurePosixPath
+from urllib.parse import unquote, urlsplit
 
-import requests
-from packaging.version import Version, InvalidVersion
+from packaging.version import InvalidVersion
 from packaging.utils import InvalidSdistFilename
-from packaging.specifiers import SpecifierSet
 
 from .distribution import Distribution, UnsupportedFileType
 from .candidate import Candidate
+from .catalog import CATALOG_NAME, Catalog, LocalCandidate
+from .prefetch import Prefetcher
+from .identifier import Identifier
+from .lru import LRUCache
+from .versions import VersionIndex
 from .test_cases import record_index
 
-PYTHON_VERSION = Version(python_version())
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
 
-class SimpleIndexFinder:
-    def __init__(self, app_context, index_url="https://pypi.org/simple"):
-        self.index_url = index_url
-        self.session = requests.Session()
-        self.cache = dict()
+class Finder:
+    """Base class of finders, subclasses implement `_project_candidates`.
+
+    A finder can be shared by concurrent resolutions, including resolutions
+    for different environments: projects are looked up once, and if two
+    threads look up the same one, the first result stored wins so that all
+    of them share candidates. Each environment gets a view on the
+    candidates whose files it supports.
+
+    At most `app_context.max_projects` projects and views are kept in memory,
+    evicted ones are looked up again when needed.
+    """
+
+    def __init__(self, app_context):
         self.app_context = app_context
+        max_entries = app_context.max_projects
+        profile = app_context.profile
+        # VersionIndex of candidates of all files by project name
+        self.cache = LRUCache("memory.projects", max_entries, profile=profile)
+        # supported candidates, with extras, by environment and identifier
+        self.views = LRUCache("memory.views", max_entries, profile=profile)
+
+    def prefetch(self, names):
+        """Start looking up the given projects in the background, if supported."""
 
-    def find_candidates(self, identifier):
+    def find_candidates(self, identifier, environment=None):
         """Return candidates created from the project name and extras."""
-        if identifier in self.cache:
-            log.debug(
-                f"reusing cached candidates for {identifier} from {self.index_url}"
-            )
-            for candidate in self.cache[identifier]:
-                yield candidate
-            return
+        yield from self.version_index(identifier, environment)
+
+    def version_index(self, identifier, environment=None):
+        """Return a VersionIndex with the candidates for identifier.
+
+        Only candidates supported by environment, by default the one of the
+        app context, are included. All identifiers of a project share the same
+        candidates, those with extras get lightweight views on them which
+        share their metadata. Files of a version are collapsed into a single
+        candidate, with only the files the environment supports.
+        """
+        if environment is None:
+            environment = self.app_context.environment
+        key = (environment, identifier)
+        index = self.views.get(key)
+        if index is None:
+            if identifier.extras:
+                base = self.version_index(Identifier(identifier.name), environment)
+                index = base.with_extras(identifier.extras)
+            else:
+                index = self._project_candidates(identifier)
+                index = index.filter(environment.supports).releases()
+            index = self.views.setdefault(key, index)
+        return index
+
+    def _project_candidates(self, identifier):
+        """Return a VersionIndex of all candidates of a project."""
+        raise NotImplementedError
+
+    def locked_candidate(self, candidate):
+        """Return the candidate to use for a locked one, or None if it's gone.
+
+        Locked candidates are created from their URL and hash alone, which
+        is all that's needed to get their metadata from an index.
+        """
+        return candidate
+
+    def close(self):
+        pass
 
-        self.cache[identifier] = []
-        log.debug(f"gathering candidates for {identifier} from {self.index_url}")
-        url = f"{self.index_url}/{identifier.name}"
 
-        response = self.session.get(
-            url, headers={"Accept": "application/vnd.pypi.simple.v1+json"}
+class SimpleIndexFinder(Finder):
+    """Find candidates on a PEP 691 simple index."""
+
+    def __init__(self, app_context, index_url="https://pypi.org/simple"):
+        super().__init__(app_context)
+        self.index_url = index_url
+        self.transport = app_context.transport
+        self.prefetcher = Prefetcher(
+            self._fetch_project, max_workers=app_context.prefetch_workers
         )
+        # pages are dropped once parsed, make sure each one is only parsed once
+        # at a time. Locks are striped by project name.
+        self.locks = [threading.Lock() for _ in range(64)]
+
+    def prefetch(self, names):
+        """Start fetching the index pages of the given projects in the background."""
+        for name in names:
+            self.prefetcher.prefetch(name)
+
+    def _fetch_project(self, name):
+        if self.app_context.snapshot:
+            self.app_context.profile.count("index.snapshot")
+            return self.app_context.snapshot.page(name)
+        data = self._download_project(name)
+        # prefetched pages are captured too, even if this resolution doesn't
+        # use them another one from the snapshot might
+        if self.app_context.record_snapshot:
+            self.app_context.record_snapshot.add_page(name, data)
+        return data
+
+    def _download_project(self, name):
+        profile = self.app_context.profile
+        cache = self.app_context.index_cache
+        entry = cache.load(self.index_url, name) if cache else None
+        if entry and cache.is_fresh(entry):
+            log.debug(f"using cached index page for {name}")
+            profile.count("index.cache.hit")
+            return entry["data"]
+
+        log.debug(f"fetching {name} from {self.index_url}")
+        url = f"{self.index_url}/{name}"
+        headers = {"Accept": "application/vnd.pypi.simple.v1+json"}
+        if entry:
+            headers.update(cache.conditional_headers(entry))
+        with profile.timer("index.fetch"):
+            response = self.transport.get(url, headers=headers)
+        profile.add_bytes("index", len(response.content))
+        if entry and response.status_code == 304:
+            log.debug(f"cached index page for {name} is still valid")
+            profile.count("index.cache.hit")
+            profile.count("index.cache.revalidated")
+            cache.refresh(self.index_url, name, entry)
+            return entry["data"]
         response.raise_for_status()
         data = response.json()
+        if cache:
+            profile.count("index.cache.miss")
+            cache.store(self.index_url, name, response, data)
+        return data
+
+    def _project_candidates(self, identifier):
+        name = identifier.name
+        index = self.cache.get(name)
+        if index is not None:
+            log.debug(f"reusing cached candidates for {name} from {self.index_url}")
+            return index
+        with self.locks[hash(name) % len(self.locks)]:
+            index = self.cache.peek(name)
+            if index is None:
+                index = self._parse_project(identifier)
+        return index
+
+    def _parse_project(self, identifier):
+        name = identifier.name
+        candidates = []
+        log.debug(f"gathering candidates for {name} from {self.index_url}")
+        profile = self.app_context.profile
+        with profile.timer("index.wait"):
+            data = self.prefetcher.get(name)
         if self.app_context.record_test_case:
             record_index(self.app_context, identifier, data)
 
+        start = time.perf_counter()
+        # share Version instances between all files of a release
+        versions = dict()
         for link in data.get("files", []):
             url = link["url"]
             sha256 = link.get("hashes", {}).get("sha256")
+            # PEP 714 renamed data-dist-info-metadata to core-metadata
+            core_metadata = link.get(
+                "core-metadata", link.get("data-dist-info-metadata", False)
+            )
             try:
-                distribution = Distribution(link["filename"])
+                distribution = Distribution(link["filename"], versions)
             except UnsupportedFileType:
                 logging.info(
                     f"skipping {link['filename']} as file format is not supported"
@@ -58,19 +193,164 @@ class SimpleIndexFinder:
                 logging.info(f"skipping {link['filename']} because of {e}")
                 continue
 
-            # Skip items that need a different Python version
-            requires_python = link.get("requires-python")
-            if requires_python:
-                spec = SpecifierSet(requires_python)
-                if PYTHON_VERSION not in spec:
-                    continue
-
             candidate = Candidate(
                 self.app_context,
                 distribution,
                 url=url,
                 sha256=sha256,
-                extras=identifier.extras,
+                core_metadata=core_metadata,
+                index_requires_python=link.get("requires-python"),
+            )
+            candidates.append(candidate)
+        index = self.cache.setdefault(name, VersionIndex(candidates))
+        # the candidates are all we need, get the page again if they're evicted
+        self.prefetcher.forget(name)
+        profile.add_timing("index.parse", time.perf_counter() - start)
+        profile.count("index.files", len(data.get("files", [])))
+        profile.count("index.candidates", len(candidates))
+        return index
+
+    def close(self):
+        self.prefetcher.shutdown()
+        stats = self.prefetcher.stats
+        log.info(f"index prefetch: {stats}")
+        profile = self.app_context.profile
+        profile.count("index.prefetch.hit", stats["hits"] + stats["waits"])
+        profile.count("index.prefetch.miss", stats["misses"])
+        profile.count("index.prefetch.waits", stats["waits"])
+        profile.count("index.prefetch.wasted", stats["wasted"])
+
+
+class LegacyMetadataFinder(Finder):
+    """Find the candidates of another finder, with other legacy metadata.
+
+    Candidates of the projects in `app_context.legacy_metadata` are copied
+    for app_context, those of all other projects are the base finder's.
+    The base finder's index pages are shared, it needs to be closed instead
+    of this one.
+    """
+
+    def __init__(self, base, app_context):
+        super().__init__(app_context)
+        self.base = base
+
+    def prefetch(self, names):
+        self.base.prefetch(names)
+
+    def version_index(self, identifier, environment=None):
+        if identifier.name not in self.app_context.legacy_metadata:
+            return self.base.version_index(identifier, environment)
+        return super().version_index(identifier, environment)
+
+    def _project_candidates(self, identifier):
+        name = identifier.name
+        index = self.cache.get(name)
+        if index is not None:
+            return index
+        base = self.base._project_candidates(identifier)
+        candidates = [c.with_app_context(self.app_context) for c in base]
+        # already sorted, sorting again would reverse the files of a version
+        index = VersionIndex(candidates, list(base.versions))
+        return self.cache.setdefault(name, index)
+
+    def locked_candidate(self, candidate):
+        return self.base.locked_candidate(candidate)
+
+
+class LocalFinder(Finder):
+    """Find candidates in a local directory of distribution files.
+
+    The directory is scanned into a Catalog, by default stored inside of it,
+    which only needs to be updated for files added since the last run. If the
+    directory is read-only, the catalog is kept in the cache directory
+    instead, or in memory.
+    """
+
+    def __init__(self, app_context, path, catalog_path=None):
+        super().__init__(app_context)
+        self.path = Path(path).resolve()
+        profile = app_context.profile
+        with profile.timer("catalog.update"):
+            self.catalog, (scanned, removed) = self._open_catalog(catalog_path)
+        profile.count("catalog.scanned", scanned)
+        log.info(f"scanned {scanned} new and removed {removed} files in {self.path}")
+
+    def _open_catalog(self, catalog_path):
+        """Return the updated catalog and the numbers of scanned and removed
+        files."""
+        if catalog_path is not None:
+            catalog = Catalog(catalog_path)
+            return catalog, catalog.update(self.path)
+        catalog = None
+        try:
+            catalog = Catalog(self.path / CATALOG_NAME)
+            return catalog, catalog.update(self.path)
+        except sqlite3.OperationalError as e:
+            if catalog is not None:
+                catalog.close()
+            fallback = ":memory:"
+            if self.app_context.cache_dir:
+                directory = self.app_context.cache_dir / "catalogs"
+                directory.mkdir(parents=True, exist_ok=True)
+                key = hashlib.sha256(str(self.path).encode()).hexdigest()[:16]
+                fallback = directory / f"{key}.sqlite"
+            log.warning(
+                f"can't keep the catalog in {self.path} ({e}), keeping it in "
+                f"{fallback} instead, pass --catalog to choose where"
+            )
+            catalog = Catalog(fallback)
+            return catalog, catalog.update(self.path)
+
+    def _project_candidates(self, identifier):
+        name = identifier.name
+        index = self.cache.get(name)
+        if index is not None:
+            return index
+
+        candidates = []
+        versions = dict()
+        for path, sha256, requires_python in self.catalog.files(name):
+            distribution = Distribution(PurePosixPath(path).name, versions)
+            candidate = LocalCandidate(
+                self.catalog,
+                path,
+                self.app_context,
+                distribution,
+                url=(self.path / path).as_uri(),
+                sha256=sha256,
+                index_requires_python=requires_python,
             )
-            self.cache[identifier].append(candidate)
-            yield candidate
+            candidates.append(candidate)
+        return self.cache.setdefault(name, VersionIndex(candidates))
+
+    def locked_candidate(self, candidate):
+        """Return the catalog's candidate for the same file, which provides its
+        metadata, or None if the file isn't in the directory anymore."""
+        for local in self._project_candidates(Identifier(candidate.name)):
+            if local.url == candidate.url or (
+                candidate.sha256 and local.sha256 == candidate.sha256
+            ):
+                return local
+        log.info(f"not reusing locked {candidate}, {candidate.url} is gone")
+        return None
+
+    def close(self):
+        self.catalog.close()
+
+
+def is_local(index_url):
+    return index_url.startswith("file:") or "://" not in index_url
+
+
+def make_finder(app_context):
+    """Return a finder for the index URL of app_context.
+
+    file:// URLs and paths are looked up with a LocalFinder, unless resolving
+    from a snapshot, which replaces the index whatever it was.
+    """
+    url = app_context.index_url
+    if app_context.snapshot or not is_local(url):
+        return SimpleIndexFinder(app_context, url)
+    if url.startswith("file:"):
+        url = unquote(urlsplit(url).path)
+    return LocalFinder(app_context, url, app_context.catalog_path)
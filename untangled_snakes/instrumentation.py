@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# upper bounds of latency histogram buckets, in milliseconds
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 60000)
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, seconds):
+        milliseconds = seconds * 1000
+        self.count += 1
+        self.total += milliseconds
+        self.min = milliseconds if self.min is None else min(self.min, milliseconds)
+        self.max = milliseconds if self.max is None else max(self.max, milliseconds)
+        for i, bound in enumerate(BUCKETS):
+            if milliseconds <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def as_dict(self):
+        labels = [f"<={bound}ms" for bound in BUCKETS] + [f">{BUCKETS[-1]}ms"]
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "mean_ms": round(self.total / self.count, 3) if self.count else None,
+            "min_ms": round(self.min, 3) if self.min is not None else None,
+            "max_ms": round(self.max, 3) if self.max is not None else None,
+            "histogram": {
+                label: count for label, count in zip(labels, self.buckets) if count
+            },
+        }
+
+
+class Profile:
+    """Thread-safe counters, transferred bytes and latency histograms.
+
+    Names are dotted, e.g. "metadata.pep658". Counters ending in ".hit" and
+    ".miss" are summarized as hit rates in the report.
+    """
+
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.timings = defaultdict(Histogram)
+        self.lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def add_bytes(self, name, n):
+        with self.lock:
+            self.bytes[name] += n
+
+    def add_timing(self, name, seconds):
+        with self.lock:
+            self.timings[name].add(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_timing(name, time.perf_counter() - start)
+
+    def hit_rates(self):
+        rates = dict()
+        for name in self.counters:
+            if not name.endswith(".hit"):
+                continue
+            prefix = name.removesuffix(".hit")
+            hits = self.counters[name]
+            total = hits + self.counters.get(f"{prefix}.miss", 0)
+            rates[prefix] = round(hits / total, 4) if total else None
+        return rates
+
+    def report(self):
+        with self.lock:
+            return {
+                "counters": dict(sorted(self.counters.items())),
+                "bytes": dict(sorted(self.bytes.items())),
+                "hit_rates": dict(sorted(self.hit_rates().items())),
+                "timings": {
+                    name: histogram.as_dict()
+                    for name, histogram in sorted(self.timings.items())
+                },
+            }
@@ -0,0 +1,152 @@
+import io
+import logging
+import re
+from io import BytesIO
+from tempfile import TemporaryFile
+
+log = logging.getLogger(__name__)
+
+# Enough to contain the end of central directory record and, for most
+# wheels, the whole central directory, so that opening a ZipFile only
+# needs a single request.
+TAIL_SIZE = 64 * 1024
+# Minimum size of any further range request, to avoid many tiny ones
+# while ZipFile reads local headers and members.
+CHUNK_SIZE = 16 * 1024
+
+CONTENT_RANGE_RE = re.compile(r"bytes (?P<start>\d+)-(?P<end>\d+)/(?P<length>\d+)")
+
+
+class RangeNotSupported(Exception):
+    pass
+
+
+def open_wheel(transport, url, ranges=True):
+    """Return a seekable file object for the wheel at url.
+
+    If the server supports range requests, only the parts actually read are
+    downloaded. Otherwise, or without ranges, the whole file is downloaded
+    into memory. Reads raise RangeNotSupported, should the server stop
+    honouring ranges later on.
+    """
+    if not ranges:
+        response = transport.get(url)
+        response.raise_for_status()
+        return BytesIO(response.content)
+    response = transport.get(
+        url, headers={"Range": f"bytes=-{TAIL_SIZE}", "Accept-Encoding": "identity"}
+    )
+    response.raise_for_status()
+    match = CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+    if response.status_code != 206 or not match:
+        log.debug(f"{url} doesn't support range requests, downloading all of it")
+        return BytesIO(response.content)
+    return HTTPRangeFile(
+        transport,
+        url,
+        int(match.group("length")),
+        int(match.group("start")),
+        response.content,
+    )
+
+
+class HTTPRangeFile(io.RawIOBase):
+    """Read-only, seekable file backed by HTTP range requests.
+
+    Downloaded ranges are written into a sparse temporary file, so that each
+    byte is fetched at most once.
+    """
+
+    def __init__(self, transport, url, length, start=0, content=b""):
+        super().__init__()
+        self.transport = transport
+        self.url = url
+        self.length = length
+        self.position = 0
+        self.downloaded = 0
+        self._file = TemporaryFile()
+        self._file.truncate(length)
+        # sorted, non-overlapping and non-adjacent [start, end) pairs
+        self._intervals = []
+        if content:
+            self._store(start, content)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.length + offset
+        else:
+            raise ValueError(f"invalid whence: {whence}")
+        if position < 0:
+            raise ValueError(f"negative seek position {position}")
+        self.position = position
+        return position
+
+    def readinto(self, buffer):
+        start = self.position
+        end = min(start + len(buffer), self.length)
+        if start >= end:
+            return 0
+        self._download(start, max(end, min(start + CHUNK_SIZE, self.length)))
+        self._file.seek(start)
+        size = self._file.readinto(memoryview(buffer)[: end - start])
+        self.position += size
+        return size
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+    def _missing(self, start, end):
+        for interval_start, interval_end in self._intervals:
+            if interval_end <= start:
+                continue
+            if interval_start >= end:
+                break
+            if interval_start > start:
+                yield start, interval_start
+            start = max(start, interval_end)
+        if start < end:
+            yield start, end
+
+    def _download(self, start, end):
+        for missing_start, missing_end in list(self._missing(start, end)):
+            response = self.transport.get(
+                self.url,
+                headers={
+                    "Range": f"bytes={missing_start}-{missing_end - 1}",
+                    "Accept-Encoding": "identity",
+                },
+            )
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise RangeNotSupported(f"{self.url} stopped honouring ranges")
+            self._store(missing_start, response.content)
+
+    def _store(self, start, content):
+        end = start + len(content)
+        self._file.seek(start)
+        self._file.write(content)
+        self.downloaded += len(content)
+
+        merged = []
+        for interval in self._intervals:
+            if interval[1] < start or interval[0] > end:
+                merged.append(interval)
+            else:
+                start = min(start, interval[0])
+                end = max(end, interval[1])
+        merged.append((start, end))
+        self._intervals = sorted(merged)
@@ -0,0 +1,52 @@
+import json
+import logging
+from posixpath import basename
+from urllib.parse import unquote, urlsplit
+
+from packaging.utils import InvalidSdistFilename, InvalidWheelFilename
+from packaging.version import InvalidVersion
+
+from .candidate import Candidate
+from .distribution import Distribution, UnsupportedFileType
+
+log = logging.getLogger(__name__)
+
+
+def read_lock(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def locked_candidates(app_context, lock):
+    """Return candidates for the sources of a lock, by project name.
+
+    They are created from the recorded URLs, hashes and Requires-Python
+    alone, so that locked projects don't need their index pages to be
+    fetched.
+    """
+    candidates = dict()
+    for name, source in lock.get("sources", {}).items():
+        filename = unquote(basename(urlsplit(source["url"]).path))
+        try:
+            distribution = Distribution(filename)
+        except (
+            UnsupportedFileType,
+            InvalidVersion,
+            InvalidSdistFilename,
+            InvalidWheelFilename,
+        ) as e:
+            log.info(f"not reusing locked {name} because of {e}")
+            continue
+        if distribution.name != name or str(distribution.version) != source.get(
+            "version"
+        ):
+            log.info(f"not reusing locked {name}, it doesn't match {filename}")
+            continue
+        candidates[name] = Candidate(
+            app_context,
+            distribution,
+            url=source["url"],
+            sha256=source.get("sha256"),
+            index_requires_python=source.get("requires_python"),
+        )
+    return candidates
@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A thread-safe mapping which evicts its least recently used entries.
+
+    Entries are evicted once there are more than `max_entries` of them, or
+    once their sizes, as returned by `sizeof`, add up to more than
+    `max_bytes`. Without limits nothing is ever evicted. Hits, misses and
+    evictions are counted in profile as "<name>.hit", "<name>.miss" and
+    "<name>.evicted".
+    """
+
+    def __init__(
+        self, name, max_entries=None, max_bytes=None, sizeof=None, profile=None
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.profile = profile
+        # (value, size) by key, least recently used first
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """Return the value of key, or None, and count a hit or a miss."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        self._count("hit" if entry is not None else "miss")
+        return entry[0] if entry is not None else None
+
+    def peek(self, key):
+        """Return the value of key, or None, without counting it as a use."""
+        entry = self.entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def setdefault(self, key, value):
+        """Store value unless key is present, return the value stored for key."""
+        size = self.sizeof(value) if self.sizeof and self.max_bytes else 0
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry[0]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            evicted = self._evict()
+        if evicted:
+            self._count("evicted", evicted)
+        return value
+
+    def _evict(self):
+        evicted = 0
+        # the most recently used entry is kept, even if it's over budget
+        while len(self.entries) > 1 and (
+            (self.max_entries and len(self.entries) > self.max_entries)
+            or (self.max_bytes and self.bytes > self.max_bytes)
+        ):
+            _, (_, size) = self.entries.popitem(last=False)
+            self.bytes -= size
+            evicted += 1
+        return evicted
+
+    def _count(self, event, n=1):
+        if self.profile is not None:
+            self.profile.count(f"{self.name}.{event}", n)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.bytes}
@@ -0,0 +1,42 @@
+from functools import lru_cache
+
+from packaging.markers import default_environment
+from packaging.requirements import Requirement
+
+from .specifiers import parse_specifier
+
+
+@lru_cache(maxsize=8192)
+def parse_requirement(line):
+    """Parse a Requires-Dist line, sharing the result between all candidates.
+
+    Equal specifiers of different lines share the same SpecifierSet, so
+    that their containment checks are memoized together.
+    """
+    requirement = Requirement(line.replace("\n", " "))
+    requirement.specifier = parse_specifier(str(requirement.specifier))
+    return requirement
+
+
+class MarkerEvaluator:
+    """Evaluate markers against a fixed environment, memoizing the results."""
+
+    def __init__(self, environment=None, maxsize=65536):
+        self.maxsize = maxsize
+        self.environment = default_environment()
+        if environment:
+            self.environment.update(environment)
+        # results by (id(marker), extra), markers are kept alive in the values
+        # so that their ids can't be reused. Starts over once full.
+        self.cache = dict()
+
+    def evaluate(self, marker, extra=""):
+        key = (id(marker), extra)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[1]
+        result = marker.evaluate({**self.environment, "extra": extra})
+        if len(self.cache) >= self.maxsize:
+            self.cache.clear()
+        self.cache[key] = (marker, result)
+        return result
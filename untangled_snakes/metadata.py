@@ -1,15 +1,13 @@
+import hashlib
 import logging
 from email.parser import BytesParser
 from io import BytesIO
-from pathlib import Path
-from contextlib import contextmanager
-from tempfile import TemporaryDirectory
 from zipfile import ZipFile
 import tarfile
 
-import requests
-from build.util import project_wheel_metadata
-from build import BuildException
+from build import BuildException, BuildBackendException
+
+from .lazy_wheel import RangeNotSupported, open_wheel
 
 log = logging.getLogger(__name__)
 
@@ -23,33 +21,98 @@ class MetadataPreparationFailed(Exception):
         super().__init__(f"Metadata preparation for {candidate.url} failed: {exc}")
 
 
+class MetadataHashMismatch(Exception):
+    def __init__(self, candidate, algorithm, expected, actual):
+        super().__init__(
+            f"{algorithm} of metadata for {candidate.url} doesn't match the index: "
+            f"expected {expected}, got {actual}"
+        )
+
+
 def fetch_metadata(candidate):
+    profile = candidate.app_context.profile
+    if candidate.app_context.snapshot:
+        profile.count("metadata.snapshot")
+        return candidate.app_context.snapshot.metadata(candidate)
+
+    store = candidate.app_context.metadata_store
+    if store:
+        metadata = store.get(candidate)
+        if metadata:
+            log.debug(f"Found metadata for {candidate} in the metadata store")
+            profile.count("metadata.store.hit")
+            return metadata
+        profile.count("metadata.store.miss")
+
+    with profile.timer("metadata.fetch"):
+        metadata = _fetch_metadata(candidate)
+    if store:
+        store.put(candidate, metadata)
+    return metadata
+
+
+def metadata_size(metadata):
+    """Approximate size of metadata in memory, by the length of its headers."""
+    return sum(len(name) + len(str(value)) for name, value in metadata.items())
+
+
+def prepare_metadata(candidate):
+    """Start building metadata in the background, if we know we'll need to."""
+    if not candidate.is_sdist:
+        return
+    if candidate.name not in candidate.app_context.legacy_metadata:
+        return
+    if candidate.app_context.snapshot:
+        return
+    store = candidate.app_context.metadata_store
+    if store and store.get(candidate):
+        return
+    candidate.app_context.sdist_builder.submit(candidate)
+
+
+def _fetch_metadata(candidate):
+    profile = candidate.app_context.profile
     metadata = metadata_from_pep658(candidate)
     if metadata:
         log.debug(f"Found metadata for {candidate} via pep658")
+        profile.count("metadata.pep658")
         return metadata
 
-    response = requests.get(candidate.url)
-    response.raise_for_status()
-    distribution_file = BytesIO(response.content)
-
+    transport = candidate.app_context.transport
     if candidate.is_wheel:
         where = "wheel"
-        metadata = metadata_from_wheel(candidate, distribution_file)
+        with profile.timer("metadata.wheel"):
+            try:
+                metadata, downloaded = metadata_from_remote_wheel(candidate)
+            except RangeNotSupported as e:
+                log.warning(f"{e}, downloading all of it")
+                profile.count("metadata.wheel.range_fallback")
+                metadata, downloaded = metadata_from_remote_wheel(candidate, False)
+        profile.count("metadata.wheel")
+        profile.add_bytes("metadata.wheel", downloaded)
     elif candidate.is_sdist:
         where = "sdist"
-        metadata = metadata_from_sdist(candidate, distribution_file)
-        if not metadata or candidate.name in candidate.app_context.legacy_metadata:
+        legacy = candidate.name in candidate.app_context.legacy_metadata
+        if not legacy:
+            # Stream the archive and stop as soon as PKG-INFO has been read,
+            # which usually is one of the first members.
+            with profile.timer("metadata.sdist"):
+                with transport.stream(candidate.url) as f:
+                    metadata = metadata_from_sdist(candidate, f)
+                    profile.add_bytes("metadata.sdist", f.tell())
+            profile.count("metadata.sdist")
+        if legacy or not metadata:
             logging.warn(
                 f"acquiring metadata for {candidate} from "
                 f"{candidate.distribution.filename}"
             )
-            distribution_file.seek(0)
-            with source_tree_from_sdist(candidate, distribution_file) as source_tree:
-                try:
-                    metadata = project_wheel_metadata(source_tree)
-                except BuildException as e:
-                    raise MetadataPreparationFailed(e, candidate)
+            try:
+                with profile.timer("metadata.build"):
+                    content = candidate.app_context.sdist_builder.metadata(candidate)
+            except (BuildException, BuildBackendException) as e:
+                raise MetadataPreparationFailed(e, candidate)
+            profile.count("metadata.build")
+            metadata = parse_metadata(BytesIO(content))
 
     if metadata:
         log.debug(f"Found metadata for {candidate} in the {where} {candidate.url}")
@@ -58,6 +121,17 @@ def fetch_metadata(candidate):
     raise MetadataNotFound(f"No metadata found for {candidate} ({candidate.url})")
 
 
+def metadata_from_remote_wheel(candidate, ranges=True):
+    """Return the metadata of a wheel and the number of bytes downloaded."""
+    transport = candidate.app_context.transport
+    with open_wheel(transport, candidate.url, ranges) as distribution_file:
+        metadata = metadata_from_wheel(candidate, distribution_file)
+        downloaded = getattr(distribution_file, "downloaded", None)
+        if downloaded is None:
+            downloaded = distribution_file.getbuffer().nbytes
+    return metadata, downloaded
+
+
 def parse_metadata(fp):
     # FIXME packaging.metadata.parse_email will be available in 23.1
     # this is wasteful, but i didn't get it to work with content.raw
@@ -66,8 +140,27 @@ def parse_metadata(fp):
 
 
 def metadata_from_pep658(candidate):
-    content = BytesIO(requests.get(f"{candidate.url}.metadata").content)
-    return parse_metadata(content)
+    if not candidate.has_core_metadata:
+        return None
+    url = f"{candidate.url}.metadata"
+    profile = candidate.app_context.profile
+    with profile.timer("metadata.pep658"):
+        response = candidate.app_context.transport.get(url)
+    profile.add_bytes("metadata.pep658", len(response.content))
+    if response.status_code >= 400:
+        log.warning(
+            f"index advertises {url}, but it returned {response.status_code}, "
+            "falling back to the distribution file"
+        )
+        return None
+    content = response.content
+    for algorithm, expected in candidate.core_metadata_hashes.items():
+        if algorithm not in hashlib.algorithms_available:
+            continue
+        actual = hashlib.new(algorithm, content).hexdigest()
+        if actual != expected:
+            raise MetadataHashMismatch(candidate, algorithm, expected, actual)
+    return parse_metadata(BytesIO(content))
 
 
 def metadata_from_wheel(candidate, distribution_file):
@@ -79,32 +172,11 @@ def metadata_from_wheel(candidate, distribution_file):
 
 
 def metadata_from_sdist(candidate, distribution_file):
+    # distribution_file doesn't need to be seekable, as it's read as a stream
     with tarfile.open(
-        candidate.distribution.filename, fileobj=distribution_file
+        candidate.distribution.filename, fileobj=distribution_file, mode="r|gz"
     ) as tar:
-        try:
-            return parse_metadata(tar.extractfile(candidate.distribution.metadata_path))
-        except KeyError:
-            pass
-
-
-@contextmanager
-def source_tree_from_sdist(candidate, distribution_file):
-    filename = candidate.distribution.filename
-    name_underscore = candidate.name.replace("-", "_")
-    search_dirs = [
-        f"{candidate.name}-{candidate.version}",
-        f"{name_underscore}-{candidate.version}",
-    ]
-    distribution_file.seek(0)
-    with tarfile.open(filename, fileobj=distribution_file) as tar, TemporaryDirectory(
-        suffix=f"metadata-preparation-{filename}"
-    ) as temp_dir:
-        tar.extractall(temp_dir, filter="data")
-        temp_dir = Path(temp_dir)
-
-        for search_dir in search_dirs:
-            if (temp_dir / search_dir).exists():
-                temp_dir = temp_dir / search_dir
-
-        yield temp_dir
+        for member in tar:
+            if member.name == candidate.distribution.metadata_path:
+                # members of streams aren't seekable, which the parser needs
+                return parse_metadata(BytesIO(tar.extractfile(member).read()))
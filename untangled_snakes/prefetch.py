@@ -0,0 +1,105 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """Run `fetch(key)` speculatively in a thread pool.
+
+    Results are shared through futures, so a key is only ever fetched once,
+    whether it was requested by `prefetch` or on demand by `get`. Unless
+    its result is forgotten or its fetch failed, then `get` fetches it again.
+    """
+
+    def __init__(self, fetch, max_workers=8):
+        self.fetch = fetch
+        self.max_workers = max_workers
+        self.executor = None
+        if max_workers:
+            self.executor = ThreadPoolExecutor(
+                max_workers, thread_name_prefix="prefetch"
+            )
+        self.futures = dict()
+        self.prefetched = set()
+        self.used = set()
+        self.lock = threading.Lock()
+
+        # prefetched and already done when requested
+        self.hits = 0
+        # prefetched, but still in flight when requested
+        self.waits = 0
+        # not prefetched, fetched on demand
+        self.misses = 0
+
+    def prefetch(self, key):
+        if self.executor is None:
+            return
+        with self.lock:
+            if key in self.futures:
+                return
+            log.debug(f"prefetching {key}")
+            self.prefetched.add(key)
+            future = self.futures[key] = self.executor.submit(self.fetch, key)
+        future.add_done_callback(lambda future: self._drop_failed(key, future))
+
+    def forget(self, key):
+        """Drop the result of key, which won't be prefetched again."""
+        with self.lock:
+            future = self.futures.get(key)
+            if future is not None and future.done():
+                self.futures[key] = None
+
+    def get(self, key):
+        with self.lock:
+            future = self.futures.get(key)
+            first_use = key not in self.used
+            self.used.add(key)
+            if future is None:
+                future = self.futures[key] = Future()
+                fetch_inline = True
+            else:
+                fetch_inline = False
+            if first_use:
+                if fetch_inline:
+                    self.misses += 1
+                elif future.done():
+                    self.hits += 1
+                else:
+                    self.waits += 1
+
+        if fetch_inline:
+            try:
+                future.set_result(self.fetch(key))
+            except BaseException as e:
+                future.set_exception(e)
+            self._drop_failed(key, future)
+        return future.result()
+
+    def _drop_failed(self, key, future):
+        # failures aren't kept: whoever waited on the fetch sees it fail, but
+        # the next get fetches again
+        if future.cancelled() or future.exception() is None:
+            return
+        with self.lock:
+            if self.futures.get(key) is future:
+                del self.futures[key]
+
+    @property
+    def wasted(self):
+        with self.lock:
+            return len(self.prefetched - self.used)
+
+    @property
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "waits": self.waits,
+            "misses": self.misses,
+            "wasted": self.wasted,
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,4 +1,4 @@
-from operator import attrgetter
+import math
 
 from packaging.requirements import Requirement
 from packaging.utils import canonicalize_name
@@ -6,11 +6,22 @@ from packaging.utils import canonicalize_name
 from resolvelib.providers import AbstractProvider
 
 from .identifier import Identifier
+from .specifiers import contains
 
 
 class PyPiProvider(AbstractProvider):
-    def __init__(self, finder):
+    def __init__(self, finder, locked=None, environment=None):
         self.finder = finder
+        # the environment to resolve for, the app context's by default
+        self.environment = environment
+        # candidates of an existing lock by project name, tried before
+        # anything else and without fetching their index pages.
+        self.locked = dict()
+        for name, candidate in (locked or dict()).items():
+            candidate = finder.locked_candidate(candidate)
+            if candidate is not None:
+                self.locked[name] = candidate
+        self._match_counts = dict()
 
     def identify(self, requirement_or_candidate):
         return Identifier.from_requirement(requirement_or_candidate)
@@ -21,28 +32,89 @@ class PyPiProvider(AbstractProvider):
     def get_preference(
         self, identifier, resolutions, candidates, information, backtrack_causes
     ):
-        return sum(1 for _ in candidates[identifier])
+        """Return a sort key, identifiers with the lowest key are resolved first.
+
+        Prefer identifiers which are pinned with "==", were requested directly,
+        caused the last conflict, or have few candidates left, in that order.
+        """
+        infos = list(information[identifier])
+        pinned = any(
+            specifier.operator in ("==", "===") and not specifier.version.endswith(".*")
+            for info in infos
+            for specifier in info.requirement.specifier
+        )
+        direct = any(info.parent is None for info in infos)
+        backtrack_cause = identifier in self._backtrack_identifiers(backtrack_causes)
+        # upper bound of the number of candidates, computed in find_matches
+        count = self._match_counts.get(identifier, math.inf)
+        return (not pinned, not direct, not backtrack_cause, count)
+
+    def _backtrack_identifiers(self, backtrack_causes):
+        identifiers = set()
+        for cause in backtrack_causes:
+            identifiers.add(self.identify(cause.requirement))
+            if cause.parent is not None:
+                identifiers.add(self.identify(cause.parent))
+        return identifiers
 
     def find_matches(self, identifier, requirements, incompatibilities):
         requirements = list(requirements[identifier])
         bad_versions = {c.version for c in incompatibilities[identifier]}
-        candidates = (
-            candidate
-            for candidate in self.finder.find_candidates(identifier)
-            if candidate.version not in bad_versions
-            and all(candidate.version in r.specifier for r in requirements)
-        )
-        return sorted(candidates, key=attrgetter("version"), reverse=True)
+        locked = self._locked_match(identifier, requirements, bad_versions)
+        if locked is None:
+            index = self.finder.version_index(identifier, self.environment)
+            lo, hi = index.bounds(r.specifier for r in requirements)
+            self._match_counts[identifier] = hi - lo
+            return lambda: self._index_matches(
+                index, lo, hi, requirements, bad_versions
+            )
+
+        self._match_counts[identifier] = 1
+
+        def matches():
+            yield locked
+            # only fetch the index if the locked candidate gets rejected
+            index = self.finder.version_index(identifier, self.environment)
+            lo, hi = index.bounds(r.specifier for r in requirements)
+            skip = bad_versions | {locked.version}
+            yield from self._index_matches(index, lo, hi, requirements, skip)
+
+        return matches
+
+    def _locked_match(self, identifier, requirements, bad_versions):
+        locked = self.locked.get(identifier.name)
+        if locked is None or locked.version in bad_versions:
+            return None
+        environment = self.environment or locked.app_context.environment
+        if not environment.supports(locked):
+            return None
+        if not all(contains(r.specifier, locked.version) for r in requirements):
+            return None
+        return locked.with_extras(identifier.extras)
+
+    def _index_matches(self, index, lo, hi, requirements, bad_versions):
+        first = True
+        for candidate in index.descending(lo, hi):
+            if candidate.version in bad_versions:
+                continue
+            if not all(contains(r.specifier, candidate.version) for r in requirements):
+                continue
+            if first:
+                candidate.prepare_metadata()
+                first = False
+            yield candidate
 
     def is_satisfied_by(self, requirement, candidate):
         if canonicalize_name(requirement.name) != candidate.name:
             return False
         # if requirement.extras not in candidate.extras:
         #    return False
-        return candidate.version in requirement.specifier
+        return contains(requirement.specifier, candidate.version)
 
     def get_dependencies(self, candidate):
-        deps = candidate.dependencies
+        deps = candidate.dependencies_for(self.environment)
+        names = {canonicalize_name(d.name) for d in deps}
+        self.finder.prefetch(name for name in names if name not in self.locked)
         # if candidate.extras:
         #    req = self.get_base_requirement(candidate)
         #    deps.append(req)
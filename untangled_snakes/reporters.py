@@ -1,10 +1,109 @@
+import json
+import logging
+import sys
+import time
+
 from rich.console import Console
 from rich.table import Table
 from resolvelib import BaseReporter
 
+log = logging.getLogger(__name__)
+
+
+class SilentReporter(BaseReporter):
+    pass
+
+
+class SummaryReporter(BaseReporter):
+    """Count resolver events and log a single summary line at the end."""
+
+    def __init__(self):
+        self.counters = dict(
+            rounds=0, requirements=0, pins=0, rejections=0, conflicts=0
+        )
+        self.start = None
+
+    def starting(self):
+        self.start = time.perf_counter()
+
+    def starting_round(self, index):
+        self.counters["rounds"] += 1
+
+    def adding_requirement(self, requirement, parent):
+        self.counters["requirements"] += 1
+
+    def resolving_conflicts(self, causes):
+        self.counters["conflicts"] += 1
+
+    def rejecting_candidate(self, criterion, candidate):
+        self.counters["rejections"] += 1
+
+    def pinning(self, candidate):
+        self.counters["pins"] += 1
+
+    def ending(self, state):
+        elapsed = time.perf_counter() - self.start
+        counters = ", ".join(f"{v} {k}" for k, v in self.counters.items())
+        log.info(
+            f"resolved {len(state.mapping)} packages in {elapsed:.2f}s: {counters}"
+        )
+
+
+class JsonReporter(BaseReporter):
+    """Write resolver events as JSON lines."""
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stderr
+
+    def _emit(self, event, **kwargs):
+        self.stream.write(json.dumps({"event": event, **kwargs}) + "\n")
+
+    def starting(self):
+        self._emit("starting")
+
+    def starting_round(self, index):
+        self._emit("starting_round", index=index)
+
+    def ending_round(self, index, state):
+        self._emit(
+            "ending_round",
+            index=index,
+            pinned=len(state.mapping),
+            criteria=len(state.criteria),
+        )
+
+    def ending(self, state):
+        self._emit(
+            "ending",
+            mapping={str(k): str(v.version) for k, v in state.mapping.items()},
+        )
+
+    def adding_requirement(self, requirement, parent):
+        self._emit(
+            "adding_requirement",
+            requirement=str(requirement),
+            parent=repr(parent) if parent else None,
+        )
+
+    def resolving_conflicts(self, causes):
+        self._emit(
+            "resolving_conflicts",
+            causes=[str(cause.requirement) for cause in causes],
+        )
+
+    def rejecting_candidate(self, criterion, candidate):
+        self._emit("rejecting_candidate", candidate=repr(candidate))
+
+    def pinning(self, candidate):
+        self._emit("pinning", candidate=repr(candidate))
+
 
 class DebugReporter(BaseReporter):
-    console = Console()
+    console = Console(stderr=True)
+
+    def __init__(self, every=None):
+        # render the state table every n rounds, in addition to the end
+        self.every = every
 
     def _log(self, *args, **kwargs):
         self.console.log(*args, **kwargs)
@@ -16,7 +115,14 @@ class DebugReporter(BaseReporter):
         self.console.rule(f"[yellow]Started [bold]Round {index}", align="left")
 
     def ending_round(self, index, state):
-        table = Table(title=f"State after Round [bold]#{index}[/]")
+        if self.every and index % self.every == 0:
+            self._log_state(f"State after Round [bold]#{index}[/]", state)
+
+    def ending(self, state):
+        self._log_state("Final State", state)
+
+    def _log_state(self, title, state):
+        table = Table(title=title)
 
         table.add_column("Status")
         table.add_column("Title")
@@ -53,3 +159,62 @@ class DebugReporter(BaseReporter):
 
     def pinning(self, candidate):
         self._log("pinning candidate:", candidate)
+
+
+class ProfilingReporter(BaseReporter):
+    """Record resolver rounds and events in a Profile, forwarding to reporter."""
+
+    def __init__(self, reporter, profile):
+        self.reporter = reporter
+        self.profile = profile
+        self.start = None
+        self.round_start = None
+
+    def starting(self):
+        self.start = time.perf_counter()
+        self.reporter.starting()
+
+    def starting_round(self, index):
+        self.round_start = time.perf_counter()
+        self.profile.count("resolver.rounds")
+        self.reporter.starting_round(index)
+
+    def ending_round(self, index, state):
+        self.profile.add_timing(
+            "resolver.round", time.perf_counter() - self.round_start
+        )
+        self.reporter.ending_round(index, state)
+
+    def ending(self, state):
+        self.profile.add_timing("resolver.resolve", time.perf_counter() - self.start)
+        self.reporter.ending(state)
+
+    def adding_requirement(self, requirement, parent):
+        self.profile.count("resolver.requirements")
+        self.reporter.adding_requirement(requirement, parent)
+
+    def resolving_conflicts(self, causes):
+        self.profile.count("resolver.conflicts")
+        self.reporter.resolving_conflicts(causes)
+
+    def rejecting_candidate(self, criterion, candidate):
+        self.profile.count("resolver.rejections")
+        self.reporter.rejecting_candidate(criterion, candidate)
+
+    def pinning(self, candidate):
+        self.profile.count("resolver.pins")
+        self.reporter.pinning(candidate)
+
+
+REPORTERS = {
+    "silent": SilentReporter,
+    "summary": SummaryReporter,
+    "json": JsonReporter,
+    "debug": DebugReporter,
+}
+
+
+def make_reporter(name, debug_every=None):
+    if name == "debug":
+        return DebugReporter(every=debug_every)
+    return REPORTERS[name]()
@@ -0,0 +1,155 @@
+import http.client
+import json
+import logging
+import os
+import socket
+import stat
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import urlsplit
+
+log = logging.getLogger(__name__)
+
+LOCALHOST = ("127.0.0.1", "localhost")
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class ResolutionFailed(Exception):
+    pass
+
+
+class ServerError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
+def parse_address(address):
+    """Return ("tcp", (host, port)) for http://host:port, or ("unix", path)."""
+    address = str(address)
+    if not address.startswith("http://"):
+        return "unix", address
+    url = urlsplit(address)
+    if url.hostname not in LOCALHOST or url.port is None:
+        raise ValueError(f"can only serve on localhost with a port, not {address}")
+    return "tcp", (url.hostname, url.port)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Serve POST /resolve with the lock of the requested resolution, and
+    GET /stats with the profiles of the server's app contexts."""
+
+    def do_GET(self):
+        if self.path != "/stats":
+            return self._reply(404, {"error": f"no such endpoint {self.path}"})
+        self._reply(200, self.server.service.stats())
+
+    def do_POST(self):
+        if self.path != "/resolve":
+            return self._reply(404, {"error": f"no such endpoint {self.path}"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+            if not isinstance(request, dict):
+                raise BadRequest("expected a JSON object")
+            lock = self.server.service.resolve(request)
+        except (json.JSONDecodeError, BadRequest) as e:
+            return self._reply(400, {"error": f"invalid request: {e}"})
+        except ResolutionFailed as e:
+            return self._reply(422, {"error": f"resolution failed: {e}"})
+        except Exception as e:
+            log.exception("failed to resolve request")
+            return self._reply(500, {"error": repr(e)})
+        self._reply(200, lock)
+
+    def _reply(self, status, data):
+        body = json.dumps(data, indent=2).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # clients of unix sockets have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        log.info(f"{self.address_string()} {format % args}")
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(address, service):
+    """Return a server for service, which handles requests concurrently.
+
+    service needs `resolve(request)` and `stats()` methods returning JSON,
+    resolve raises BadRequest for invalid requests and ResolutionFailed for
+    requests which can't be resolved.
+    """
+    kind, bind_address = parse_address(address)
+    if kind == "tcp":
+        server = ThreadingHTTPServer(bind_address, RequestHandler)
+    else:
+        remove_stale_socket(bind_address)
+        server = UnixHTTPServer(bind_address, RequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def remove_stale_socket(path):
+    """Remove the socket at path if nothing is listening on it anymore."""
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            return
+    except FileNotFoundError:
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except ConnectionRefusedError:
+            log.info(f"removing stale socket {path}")
+            os.unlink(path)
+        else:
+            raise OSError(f"already serving on {path}")
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request(address, method, path, payload=None, timeout=None):
+    """Send a request to a server, return its JSON response.
+
+    Raises ServerError if the server couldn't handle the request.
+    """
+    kind, connect_address = parse_address(address)
+    if kind == "tcp":
+        connection = http.client.HTTPConnection(*connect_address, timeout=timeout)
+    else:
+        connection = UnixHTTPConnection(connect_address, timeout=timeout)
+    try:
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body else {}
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        data = json.loads(response.read())
+    finally:
+        connection.close()
+    if response.status != 200:
+        raise ServerError(response.status, data.get("error"))
+    return data
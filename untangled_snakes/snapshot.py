@@ -0,0 +1,157 @@
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+from .cache import decode_metadata, encode_metadata, metadata_key
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS info (
+    key TEXT PRIMARY KEY,
+    value TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS projects (
+    name TEXT PRIMARY KEY
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS files (
+    project TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    url TEXT NOT NULL,
+    sha256 TEXT,
+    requires_python TEXT,
+    core_metadata TEXT,
+    PRIMARY KEY (project, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS metadata (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class NotInSnapshot(LookupError):
+    pass
+
+
+class Snapshot:
+    """Index pages and core metadata, captured in a single SQLite file.
+
+    Only the fields of index pages we use are kept, one row per file, and
+    metadata headers are stored compressed, keyed like in the metadata
+    store. Snapshots opened without `writable` are read-only and
+    memory-mapped.
+    """
+
+    def __init__(self, path, writable=False):
+        self.path = Path(path)
+        if writable:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.executescript(SCHEMA)
+        else:
+            if not self.path.exists():
+                raise FileNotFoundError(f"no snapshot at {self.path}")
+            self.connection = sqlite3.connect(
+                f"{self.path.resolve().as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+            )
+            self.connection.execute("PRAGMA mmap_size = 268435456")
+        self.lock = threading.Lock()
+
+    def info(self, key):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM info WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_info(self, key, value):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def page(self, name):
+        """Return the index page of a project, as far as we use it."""
+        with self.lock:
+            known = self.connection.execute(
+                "SELECT 1 FROM projects WHERE name = ?", (name,)
+            ).fetchone()
+            if not known:
+                raise NotInSnapshot(f"{name} is not in the snapshot {self.path}")
+            rows = self.connection.execute(
+                "SELECT filename, url, sha256, requires_python, core_metadata "
+                "FROM files WHERE project = ? ORDER BY position",
+                (name,),
+            ).fetchall()
+        files = []
+        for filename, url, sha256, requires_python, core_metadata in rows:
+            link = {"filename": filename, "url": url, "hashes": {}}
+            if sha256:
+                link["hashes"]["sha256"] = sha256
+            if requires_python:
+                link["requires-python"] = requires_python
+            if core_metadata:
+                link["core-metadata"] = json.loads(core_metadata)
+            files.append(link)
+        return {"files": files}
+
+    def add_page(self, name, data):
+        rows = []
+        for position, link in enumerate(data.get("files", [])):
+            core_metadata = link.get(
+                "core-metadata", link.get("data-dist-info-metadata", False)
+            )
+            rows.append(
+                (
+                    name,
+                    position,
+                    link["filename"],
+                    link["url"],
+                    link.get("hashes", {}).get("sha256"),
+                    link.get("requires-python"),
+                    json.dumps(core_metadata) if core_metadata else None,
+                )
+            )
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO projects (name) VALUES (?)", (name,)
+            )
+            self.connection.execute("DELETE FROM files WHERE project = ?", (name,))
+            self.connection.executemany(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def metadata(self, candidate):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT data FROM metadata WHERE key = ?", (metadata_key(candidate),)
+            ).fetchone()
+        if row is None:
+            raise NotInSnapshot(
+                f"metadata of {candidate} is not in the snapshot {self.path}"
+            )
+        return decode_metadata(row[0])
+
+    def add_metadata(self, candidate, metadata):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO metadata (key, data) VALUES (?, ?)",
+                (metadata_key(candidate), encode_metadata(metadata)),
+            )
+
+    def counts(self):
+        with self.lock:
+            return {
+                table: self.connection.execute(
+                    f"SELECT count(*) FROM {table}"
+                ).fetchone()[0]
+                for table in ("projects", "files", "metadata")
+            }
+
+    def close(self):
+        self.connection.close()
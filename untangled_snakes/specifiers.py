@@ -0,0 +1,39 @@
+from functools import lru_cache
+
+from packaging.specifiers import SpecifierSet
+
+
+@lru_cache(maxsize=4096)
+def parse_specifier(string):
+    """Parse a specifier set, sharing the result between all its users."""
+    return SpecifierSet(string)
+
+
+class ContainmentMemo:
+    """Memoize whether versions are contained in specifier sets.
+
+    At most `maxsize` results are kept, the memo starts over once full.
+    """
+
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        # results by (id(specifier), id(version)), both are kept alive in the
+        # values so that their ids can't be reused.
+        self.cache = dict()
+
+    def contains(self, specifier, version):
+        key = (id(specifier), id(version))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[2]
+        result = version in specifier
+        if len(self.cache) >= self.maxsize:
+            self.cache.clear()
+        self.cache[key] = (specifier, version, result)
+        return result
+
+
+# shared by all environments and resolutions, versions and specifiers are
+# shared between candidates and requirements parsed from the same strings.
+CONTAINMENT = ContainmentMemo()
+contains = CONTAINMENT.contains
@@ -0,0 +1,230 @@
+import asyncio
+import io
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from importlib.util import find_spec
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+log = logging.getLogger(__name__)
+
+# responses worth retrying, as the server is likely to recover
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+class Transport:
+    """Base class of the HTTP clients all network I/O goes through.
+
+    Subclasses implement `_get` and `_stream`. Requests failing with a
+    transient error or status are retried here, with exponential backoff.
+    Up to pool_size connections are kept alive for reuse.
+    """
+
+    # exceptions of the backend worth retrying
+    transient_errors = ()
+
+    def __init__(
+        self, pool_size=16, retries=3, timeout=30.0, backoff=0.5, profile=None
+    ):
+        self.pool_size = pool_size
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.profile = profile
+
+    def get(self, url, headers=None):
+        """Return the response to a GET request, with its content read."""
+        attempt = 0
+        while True:
+            try:
+                response = self._get(url, headers or {})
+            except self.transient_errors as e:
+                if attempt >= self.retries:
+                    raise
+                log.info(f"retrying {url} after {e!r}")
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                if attempt >= self.retries:
+                    return response
+                log.info(f"retrying {url} after status {response.status_code}")
+            if self.profile:
+                self.profile.count("transport.retries")
+            time.sleep(self.backoff * 2**attempt)
+            attempt += 1
+
+    @contextmanager
+    def stream(self, url, headers=None):
+        """Yield a file object with the decoded body of a GET request.
+
+        Its `tell` returns the number of bytes read so far.
+        Unlike `get`, streams aren't retried.
+        """
+        with self._stream(url, headers or {}) as f:
+            yield f
+
+    def _get(self, url, headers):
+        raise NotImplementedError
+
+    def _stream(self, url, headers):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class RequestsTransport(Transport):
+    transient_errors = (
+        requests.ConnectionError,
+        requests.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=self.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _get(self, url, headers):
+        return self.session.get(url, headers=headers, timeout=self.timeout)
+
+    @contextmanager
+    def _stream(self, url, headers):
+        with self.session.get(
+            url, headers=headers, stream=True, timeout=self.timeout
+        ) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            yield response.raw
+
+    def close(self):
+        self.session.close()
+
+
+class ChunkReader(io.RawIOBase):
+    """Read from an iterator of byte chunks, as given by next_chunk."""
+
+    def __init__(self, next_chunk):
+        super().__init__()
+        self.next_chunk = next_chunk
+        self.chunk = b""
+        self.offset = 0
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self.offset >= len(self.chunk):
+            chunk = self.next_chunk()
+            if chunk is None:
+                return 0
+            self.chunk, self.offset = chunk, 0
+        n = min(len(b), len(self.chunk) - self.offset)
+        b[:n] = self.chunk[self.offset : self.offset + n]
+        self.offset += n
+        self.position += n
+        return n
+
+    def tell(self):
+        return self.position
+
+
+class HttpxTransport(Transport):
+    """Transport based on httpx, using HTTP/2 if h2 is installed.
+
+    With HTTP/2, concurrent requests to a host are multiplexed over a single
+    connection.
+    """
+
+    def __init__(self, **kwargs):
+        if httpx is None:
+            raise RuntimeError(
+                "the httpx transport needs httpx, install untangled_snakes[httpx]"
+            )
+        super().__init__(**kwargs)
+        self.transient_errors = (httpx.TransportError,)
+        self.client = self._client()
+
+    def _client_options(self):
+        return dict(
+            http2=find_spec("h2") is not None,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_keepalive_connections=self.pool_size),
+            follow_redirects=True,
+        )
+
+    def _client(self):
+        return httpx.Client(**self._client_options())
+
+    def _get(self, url, headers):
+        return self.client.get(url, headers=headers)
+
+    @contextmanager
+    def _stream(self, url, headers):
+        with self.client.stream("GET", url, headers=headers) as response:
+            response.raise_for_status()
+            chunks = response.iter_bytes()
+            yield ChunkReader(lambda: next(chunks, None))
+
+    def close(self):
+        self.client.close()
+
+
+class AsyncHttpxTransport(HttpxTransport):
+    """Transport running an httpx.AsyncClient on an event loop in a thread.
+
+    Blocking callers, like the prefetcher's threads, hand their requests to
+    the loop, which does all the network I/O.
+    """
+
+    def _client(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="transport", daemon=True
+        )
+        self.thread.start()
+        return httpx.AsyncClient(**self._client_options())
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def _get(self, url, headers):
+        return self._run(self.client.get(url, headers=headers))
+
+    @contextmanager
+    def _stream(self, url, headers):
+        context = self.client.stream("GET", url, headers=headers)
+        response = self._run(context.__aenter__())
+        try:
+            response.raise_for_status()
+            chunks = response.aiter_bytes()
+            yield ChunkReader(lambda: self._run(anext(chunks, None)))
+        finally:
+            self._run(context.__aexit__(None, None, None))
+
+    def close(self):
+        self._run(self.client.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+TRANSPORTS = {
+    "requests": RequestsTransport,
+    "httpx": HttpxTransport,
+    "httpx-async": AsyncHttpxTransport,
+}
+
+
+def make_transport(name="requests", **kwargs):
+    return TRANSPORTS[name](**kwargs)
@@ -0,0 +1,101 @@
+from bisect import bisect_left, bisect_right
+
+from packaging.version import Version
+
+
+class VersionIndex:
+    """Candidates of a project, sorted by version.
+
+    Candidates are stored in ascending order, but within a version in
+    reverse order of the index. So iterating backwards yields the newest
+    versions first, with files of a version in the order of the index.
+    """
+
+    def __init__(self, candidates, versions=None):
+        if versions is None:
+            candidates = sorted(reversed(candidates), key=lambda c: c.version)
+            versions = [c.version for c in candidates]
+        self.candidates = candidates
+        self.versions = versions
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def __iter__(self):
+        return iter(self.candidates)
+
+    def filter(self, predicate):
+        """Return a VersionIndex of the candidates for which predicate is true."""
+        keep = [i for i, c in enumerate(self.candidates) if predicate(c)]
+        if len(keep) == len(self.candidates):
+            return self
+        return VersionIndex(
+            [self.candidates[i] for i in keep], [self.versions[i] for i in keep]
+        )
+
+    def releases(self):
+        """Return a VersionIndex with a single candidate for each version.
+
+        See Candidate.for_release, files of a version are passed in index
+        order.
+        """
+        candidates = []
+        versions = []
+        lo = 0
+        while lo < len(self.versions):
+            hi = bisect_right(self.versions, self.versions[lo], lo)
+            files = self.candidates[lo:hi]
+            candidates.append(files[0].for_release(files[::-1]))
+            versions.append(self.versions[lo])
+            lo = hi
+        if len(candidates) == len(self.candidates):
+            return self
+        return VersionIndex(candidates, versions)
+
+    def with_extras(self, extras):
+        return VersionIndex(
+            [c.with_extras(extras) for c in self.candidates], self.versions
+        )
+
+    def bounds(self, specifier_sets):
+        """Return a range of indices outside of which no version can match.
+
+        Only simple bounds are used to narrow the range, candidates within
+        it still need to be checked against the full specifiers.
+        """
+        lo, hi = 0, len(self.versions)
+        for specifier_set in specifier_sets:
+            for specifier in specifier_set:
+                operator = specifier.operator
+                if operator not in (">=", "~=", "<", "=="):
+                    continue
+                if specifier.version.endswith(".*") or "+" in specifier.version:
+                    continue
+                version = Version(specifier.version)
+                if operator in (">=", "~="):
+                    lo = max(lo, bisect_left(self.versions, version, lo, hi))
+                elif operator == "<":
+                    hi = min(hi, bisect_left(self.versions, version, lo, hi))
+                else:
+                    lo = max(lo, bisect_left(self.versions, version, lo, hi))
+                    hi = min(hi, self._end_of_release(version, lo, hi))
+        return lo, max(lo, hi)
+
+    def _end_of_release(self, version, lo, hi):
+        # "==" also matches local versions, which sort after the public one
+        end = bisect_right(self.versions, version, lo, hi)
+        while end < hi:
+            candidate_version = self.versions[end]
+            if candidate_version.local is None:
+                break
+            if Version(candidate_version.public) != version:
+                break
+            end += 1
+        return end
+
+    def descending(self, lo=0, hi=None):
+        """Iterate over candidates in [lo, hi), newest first."""
+        if hi is None:
+            hi = len(self.candidates)
+        for i in range(hi - 1, lo - 1, -1):
+            yield self.candidates[i]